@@ -1,9 +1,14 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, send_from_directory, redirect, url_for, stream_with_context
 import uuid
 import os
-from threading import Thread
-import subprocess
-import sys
+import threading
+from render_pool import RenderPool
+from job_queue import JobQueue, QueueFull
+from whisper_models import DEFAULT_WHISPER_MODEL, MODEL_PARAMS_M
+from progress import broker, sse_stream
+from job_store import JobStore
+from llm_cache import sha256_file
+from uploads import ChunkedUploads, UploadError
 
 app = Flask(__name__)
 app.secret_key = '12345'
@@ -13,35 +18,64 @@ PROCESSED_FOLDER = 'media/videos'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
-def process_video(video_url, upload_id):
+# Resumable uploads of local video files, stored under their sha256.
+uploads = ChunkedUploads(UPLOAD_FOLDER)
+
+def lazy(factory):
+    """
+    Returns a getter that creates the object on first use. Spawned render and
+    Whisper workers re-import this module as __mp_main__, so anything with side
+    effects (recovering jobs from SQLite, starting threads) must not be created at import.
+    """
+    lock = threading.Lock()
+    created = []
+
+    def get():
+        with lock:
+            if not created:
+                created.append(factory())
+            return created[0]
+    return get
+
+# State of every job by upload_id (persisted when JOB_DB_PATH is set).
+get_jobs = lazy(JobStore)
+
+def report_progress(job_id, stage, **info):
+    get_jobs().transition(job_id, stage, **info)
+    broker.publish(job_id, stage, **info)
+
+def create_render_pool():
+    pool = RenderPool()
+    pool.add_progress_listener(lambda job_id, stage, info: report_progress(job_id, stage, **info))
+    return pool
+
+# Pre-warmed worker processes that run script-code.py's pipeline.
+get_render_pool = lazy(create_render_pool)
+
+def process_video(video_url, upload_id, whisper_model=DEFAULT_WHISPER_MODEL, per_slide=False, content_hash=None,
+                  voiceover=False):
     try:
         output_path = os.path.abspath(os.path.join(PROCESSED_FOLDER, f'{upload_id}.mp4'))
-        
-        process = subprocess.Popen(
-            [sys.executable, 'script-code.py', video_url],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            cwd=os.getcwd()
-        )
-        
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                print(f"[PROCESSING LOG] {output.strip()}")
-        
-        if process.returncode == 0:
-            generated_path = os.path.abspath(os.path.join('media', 'videos', 'GeneratedScene.mp4'))
-            if os.path.exists(generated_path):
-                os.rename(generated_path, output_path)
-                return True
-        return False
+        result = get_render_pool().submit(
+            video_url, output_path, job_id=upload_id, whisper_model=whisper_model, per_slide=per_slide,
+            content_hash=content_hash, voiceover=voiceover
+        ).result()
+        print(f"Job {upload_id} metrics: {result['metrics']}")
+        get_jobs().transition(upload_id, 'done', output_path=result['output_path'], metrics=result['metrics'],
+                              stage_durations=result['metrics'].get('stages', {}))
+        broker.publish(upload_id, 'done')
+        return True
     except Exception as e:
         print(f"Error processing video: {str(e)}")
+        report_progress(upload_id, 'failed', error=str(e))
         return False
 
+# Admission control: a bounded number of queued jobs, run JOB_CONCURRENCY at a time.
+get_job_queue = lazy(lambda: JobQueue(
+    process_video,
+    on_queued=lambda job_id, position: broker.publish(job_id, 'queued', queue_position=position)
+))
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -50,41 +84,176 @@ def index():
 def process():
     data = request.get_json()
     video_url = data.get('video_url')
+    file_id = data.get('file_id')
+    whisper_model = data.get('whisper_model', DEFAULT_WHISPER_MODEL)
+    per_slide = bool(data.get('per_slide', False))
+    voiceover = bool(data.get('voiceover', False))
+
+    # A file sent through /uploads is named by its sha256, which the pipeline can reuse.
+    content_hash = None
+    if file_id:
+        video_url = uploads.path_for(file_id)
+        if not video_url:
+            return jsonify({'error': 'Unknown or incomplete upload'}), 400
+        video_url = os.path.abspath(video_url)
+        content_hash = file_id.split('.')[0]
 
     if not video_url:
         return jsonify({'error': 'No video URL provided'}), 400
+    if whisper_model not in MODEL_PARAMS_M:
+        return jsonify({'error': f'Unknown Whisper model: {whisper_model}'}), 400
     
     print(f"Received video URL: {video_url}")
 
     upload_id = str(uuid.uuid4())
+    get_jobs().create(upload_id, video_url=video_url, whisper_model=whisper_model, per_slide=per_slide,
+                      voiceover=voiceover)
+    try:
+        position = get_job_queue().submit(upload_id, video_url, upload_id, whisper_model, per_slide, content_hash,
+                                          voiceover)
+    except QueueFull as e:
+        get_jobs().transition(upload_id, 'failed', error='Rejected: job queue full')
+        response = jsonify({'error': 'Too many videos are being processed, please try again later'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+
     session['upload_id'] = upload_id
     session['processing'] = True
     
-    thread = Thread(target=process_video, args=(video_url, upload_id))
-    thread.start()
-    
-    return jsonify({'message': 'Processing started', 'upload_id': upload_id})
+    return jsonify({'message': 'Processing started', 'upload_id': upload_id, 'queue_position': position})
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Starts a resumable upload: {"filename": ..., "size": bytes}."""
+    data = request.get_json() or {}
+    try:
+        return jsonify(uploads.create(data.get('filename'), data.get('size'))), 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Current offset of an upload, for resuming after an interruption."""
+    try:
+        return jsonify(uploads.status(upload_id))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """Appends the request body at the Upload-Offset header; the body is streamed to disk."""
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    try:
+        return jsonify(uploads.append(upload_id, offset, request.stream))
+    except UploadError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), e.status
 
 @app.route('/check_status', methods=['GET'])
 def check_status():
-    upload_id = session.get('upload_id')
-    if upload_id:
-        output_path = os.path.join(PROCESSED_FOLDER, f'{upload_id}.mp4')
-        if os.path.exists(output_path):
+    upload_id = request.args.get('upload_id') or session.get('upload_id')
+    job = get_jobs().get(upload_id) if upload_id else None
+    if job:
+        if job['state'] == 'done':
             session['processing'] = False
             return {'status': 'complete'}
+        if job['state'] == 'failed':
+            return {'status': 'failed', 'error': job['error']}
+        position = get_job_queue().position(upload_id)
+        if position is not None:
+            return {'status': 'queued', 'queue_position': position}
     return {'status': 'processing'}
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    job['queue_position'] = get_job_queue().position(job_id)
+    return jsonify(job)
+
+@app.route('/jobs')
+def list_jobs():
+    """Pages through all jobs, newest first, or returns the jobs named in ?ids=a,b,c."""
+    ids = request.args.get('ids')
+    if ids:
+        found = [get_jobs().get(job_id) for job_id in ids.split(',')]
+        return jsonify({'jobs': [job for job in found if job is not None]})
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    page, total = get_jobs().list(offset, limit)
+    return jsonify({'jobs': page, 'total': total, 'offset': offset, 'limit': limit})
+
+@app.route('/events')
+@app.route('/events/<upload_id>')
+def events(upload_id=None):
+    """Streams a job's progress as server-sent events (defaults to the session's job)."""
+    upload_id = upload_id or session.get('upload_id')
+    if not upload_id or broker.latest(upload_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    # EventSource reconnects send the id of the last event they received.
+    last_event_id = request.headers.get('Last-Event-ID')
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    return Response(
+        stream_with_context(sse_stream(broker, upload_id, start)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/result')
 def result():
-    upload_id = session.get('upload_id')
+    upload_id = request.args.get('upload_id') or session.get('upload_id')
     if not upload_id:
         return redirect(url_for('index'))
     return render_template('result.html', video_id=upload_id)
 
+# Rendered videos never change once promoted, so clients may cache them for a year.
+VIDEO_MAX_AGE = 365 * 24 * 3600
+
+# path -> (mtime, size, sha256), so each output is hashed once per process.
+_video_hashes = {}
+
+def video_etag(path):
+    """Strong ETag for a video, taken from the sha256 of its contents."""
+    stat = os.stat(path)
+    cached = _video_hashes.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+        cached = (stat.st_mtime, stat.st_size, sha256_file(path))
+        _video_hashes[path] = cached
+    return cached[2]
+
+def send_video(video_id, as_attachment):
+    """
+    Sends a rendered video with byte-range support (Range / 206 responses),
+    a content-hash ETag for If-None-Match, and long-lived immutable caching.
+    """
+    filename = f'{video_id}.mp4'
+    path = os.path.join(PROCESSED_FOLDER, filename)
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Video not found'}), 404
+    response = send_from_directory(
+        PROCESSED_FOLDER, filename,
+        mimetype='video/mp4',
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=video_etag(path),
+        max_age=VIDEO_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/download/<video_id>')
 def download(video_id):
-    return send_from_directory(PROCESSED_FOLDER, f'{video_id}.mp4', as_attachment=True)
+    return send_video(video_id, as_attachment=True)
+
+@app.route('/stream/<video_id>')
+def stream(video_id):
+    """Inline, seekable playback for the result page's <video> player."""
+    return send_video(video_id, as_attachment=False)
 
 if __name__ == '__main__':
+    get_jobs()  # recovers jobs interrupted by the previous run
+    get_render_pool().start()
     app.run(host='0.0.0.0', port=8000, debug=False, use_reloader=False)
@@ -0,0 +1,32 @@
+"""
+atomic_files.py
+
+Atomic replacement of files that other processes read while they are written.
+
+atomic_path() hands out a temporary path next to the target. Whatever the
+block writes there is renamed over the target in one step when the block
+succeeds, and removed when it fails, so readers see either the old file or
+the complete new one, never a partial one.
+
+Usage:
+    with atomic_path(path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(entries, f)
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def atomic_path(path, suffix='.tmp'):
+    """Yields a temporary path in path's directory that replaces `path` when the block succeeds."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,63 @@
+"""
+audio_extract.py
+
+Extracts a video's soundtrack once as 16 kHz mono PCM, the format Whisper works in.
+
+Whisper's transcribe(path) runs ffmpeg over the whole container on every call.
+extract_audio() demuxes only the audio stream with PyAV, resamples it while
+decoding and writes a small WAV file next to the job, so Whisper and any later
+voice alignment read a few megabytes of PCM instead of the full video.
+
+Usage:
+    audio_path = extract_audio(video_path, os.path.join(workdir, "audio.wav"))
+    samples = load_audio(audio_path)       # float32 in [-1, 1], ready for Whisper
+    model.transcribe(samples)
+"""
+
+import os
+import wave
+
+import numpy as np
+
+from atomic_files import atomic_path
+
+# Whisper resamples everything to 16 kHz mono; doing it here avoids a second pass.
+AUDIO_SAMPLE_RATE = 16000
+
+def extract_audio(video_path, output_path, sample_rate=AUDIO_SAMPLE_RATE):
+    """
+    Writes the first audio stream of `video_path` to `output_path` as 16-bit mono
+    WAV and returns the path. An existing file is reused; a video without audio
+    returns None.
+    """
+    if os.path.exists(output_path):
+        return output_path
+    import av
+
+    with av.open(video_path) as container:
+        if not container.streams.audio:
+            return None
+        stream = container.streams.audio[0]
+        stream.thread_type = 'AUTO'
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=sample_rate)
+        with atomic_path(output_path, suffix='.part') as part_path, wave.open(part_path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(sample_rate)
+            # Decoding only the audio stream leaves the video packets undecoded.
+            for frame in container.decode(stream):
+                for resampled in resampler.resample(frame):
+                    out.writeframes(resampled.to_ndarray().tobytes())
+            for resampled in resampler.resample(None):  # flush the resampler
+                out.writeframes(resampled.to_ndarray().tobytes())
+    return output_path
+
+def load_audio(audio_path):
+    """Reads a WAV file written by extract_audio() as float32 samples in [-1, 1]."""
+    with wave.open(audio_path, 'rb') as f:
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+def duration(audio_path):
+    with wave.open(audio_path, 'rb') as f:
+        return f.getnframes() / f.getframerate()
@@ -0,0 +1,66 @@
+"""
+bench_spec_parser.py
+
+Micro-benchmark of spec_parser.parse_spec against the previous parsing path
+(strip backticks, drop 'json\\n', ast.literal_eval).
+
+It reports which response shapes each path accepts (and whether LaTeX survives) and, on a shape both accept,
+the time per parse for a small and a large scene.
+
+Usage:
+    python3 bench_spec_parser.py [repeat]
+"""
+
+import ast
+import sys
+import timeit
+
+from spec_parser import parse_spec
+
+def legacy_parse(text):
+    """The parsing that convert_string_to_dict used to do."""
+    cleaned_str = text.strip().strip('`').replace('json\n', '')
+    return ast.literal_eval(cleaned_str)
+
+ELEMENT = '    {"type": "math", "content": [r"F(\\omega) = \\int_{-\\infty}^{\\infty} f(t) e^{-i\\omega t} dt"], "speak": ["Explain the equation."]},\n'
+
+def scene(elements, quoted_keys=True, fenced=False, trailing_commas=True):
+    title_key, elements_key = ('"title"', '"elements"') if quoted_keys else ('title', 'elements')
+    body = ELEMENT * elements
+    if not trailing_commas:
+        body = body.rstrip(',\n') + '\n'
+    text = f'{{\n{title_key}: "Introduction to Fourier Transform",\n{elements_key}: [\n{body}]\n}}'
+    return f'```json\n{text}\n```' if fenced else text
+
+VARIANTS = {
+    'quoted keys, no trailing commas': scene(4, trailing_commas=False),
+    'quoted keys, trailing commas': scene(4),
+    'fenced': scene(4, fenced=True),
+    'unquoted keys (the prompt format)': scene(4, quoted_keys=False),
+    'fenced, unquoted keys': scene(4, quoted_keys=False, fenced=True),
+    'non-raw LaTeX string': '{"title": "t", "elements": [{"type": "math", "content": ["\\frac{a}{b}"]}]}',
+}
+
+def outcome(parse, text):
+    """'ok', 'FAIL', or 'mangled' when a LaTeX backslash came back as a control character."""
+    try:
+        result = parse(text)
+    except (ValueError, SyntaxError):
+        return 'FAIL'
+    return 'mangled' if any(c in repr(result) for c in ('\\x0c', '\\x07', '\\x08')) else 'ok'
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'response shape':<36} {'legacy':>8} {'parse_spec':>11}")
+    for name, text in VARIANTS.items():
+        print(f"{name:<36} {outcome(legacy_parse, text):>8} {outcome(parse_spec, text):>11}")
+    print()
+    for elements in (4, 200):
+        text = scene(elements, trailing_commas=False)
+        legacy = timeit.timeit(lambda: legacy_parse(text), number=repeat) / repeat
+        fast = timeit.timeit(lambda: parse_spec(text), number=repeat) / repeat
+        print(f"{elements:>3} elements ({len(text)} chars): legacy {legacy * 1e6:8.1f} us, "
+              f"parse_spec {fast * 1e6:8.1f} us ({legacy / fast:.1f}x)")
+
+if __name__ == '__main__':
+    main()
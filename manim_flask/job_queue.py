@@ -0,0 +1,117 @@
+"""
+job_queue.py
+
+A bounded FIFO job queue with admission control for the Flask app.
+
+At most `concurrency` jobs run at once; at most `max_depth` more may wait.
+Submitting to a full queue raises QueueFull with a Retry-After estimate, so a
+burst of requests is turned away instead of starting dozens of Whisper and
+manim processes at once. Queue positions are O(1) lookups.
+
+Usage:
+    queue = JobQueue(process_video, concurrency=2, max_depth=20)
+    queue.submit(job_id, video_url, job_id)   # runs process_video(video_url, job_id)
+    queue.position(job_id)                    # 1 = next to start, None = not waiting
+"""
+
+import os
+import math
+import time
+import threading
+from collections import deque
+
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', os.environ.get('RENDER_WORKERS', '2')))
+JOB_QUEUE_DEPTH = int(os.environ.get('JOB_QUEUE_DEPTH', '20'))
+
+# Retry-After used until a job has finished and its duration is known.
+DEFAULT_JOB_SECONDS = 60
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class JobQueue:
+    """
+    Runs fn(*args, **kwargs) for each submitted job on `concurrency` threads.
+    on_queued(job_id, position) is called for each admitted job before any
+    runner can start it, so a 'queued' report never follows the job's first stage.
+    """
+
+    def __init__(self, fn, concurrency=JOB_CONCURRENCY, max_depth=JOB_QUEUE_DEPTH, on_queued=None):
+        self.fn = fn
+        self.on_queued = on_queued
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self._pending = deque()  # (job_id, args, kwargs)
+        self._tickets = {}  # waiting job_id -> sequence number
+        self._enqueued = 0
+        self._started = 0
+        self._running = 0
+        self._avg_seconds = None
+        self._cond = threading.Condition()
+        for i in range(concurrency):
+            threading.Thread(target=self._dispatch, name=f'job-runner-{i}', daemon=True).start()
+
+    def submit(self, job_id, *args, **kwargs):
+        """
+        Queues a job and returns its queue position at admission, or raises
+        QueueFull when max_depth jobs are already waiting.
+        """
+        with self._cond:
+            if len(self._pending) >= self.max_depth:
+                raise QueueFull(self._retry_after())
+            self._tickets[job_id] = self._enqueued
+            self._enqueued += 1
+            self._pending.append((job_id, args, kwargs))
+            position = self._tickets[job_id] - self._started + 1
+            if self.on_queued is not None:
+                self.on_queued(job_id, position)
+            self._cond.notify()
+        return position
+
+    def position(self, job_id):
+        """1-based position among waiting jobs, or None once the job has started."""
+        with self._cond:
+            ticket = self._tickets.get(job_id)
+            if ticket is None:
+                return None
+            return ticket - self._started + 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': len(self._pending),
+                'running': self._running,
+                'concurrency': self.concurrency,
+                'max_depth': self.max_depth,
+            }
+
+    def _retry_after(self):
+        # Time for the running jobs and the whole queue ahead to drain one slot.
+        seconds = self._avg_seconds or DEFAULT_JOB_SECONDS
+        return max(1, math.ceil(seconds * (len(self._pending) + 1) / self.concurrency))
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job_id, args, kwargs = self._pending.popleft()
+                del self._tickets[job_id]
+                self._started += 1
+                self._running += 1
+            start = time.monotonic()
+            try:
+                self.fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+            finally:
+                elapsed = time.monotonic() - start
+                with self._cond:
+                    self._running -= 1
+                    # Exponentially weighted, so Retry-After follows recent load.
+                    if self._avg_seconds is None:
+                        self._avg_seconds = elapsed
+                    else:
+                        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
@@ -0,0 +1,123 @@
+"""
+job_store.py
+
+Registry of processing jobs keyed by upload_id, optionally persisted to SQLite.
+
+Each job record holds its state, timestamps, per-stage durations, error text and
+output path. Lookups by id are dict lookups and listings are slices of the
+creation order, so clients and load balancers can check many jobs at once
+without relying on the session cookie.
+
+Usage:
+    jobs = JobStore(db_path=os.environ.get("JOB_DB_PATH"))
+    jobs.create(upload_id, video_url=url)
+    jobs.transition(upload_id, "rendering")
+    jobs.get(upload_id)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from progress import moves_back
+
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH')  # unset: keep jobs in memory only
+
+# Stages after which a job is finished, and the job state each one maps to.
+FINAL_STATES = {'done': 'done', 'failed': 'failed'}
+
+class JobStore:
+    """In-process job registry; with db_path, every change is also written to SQLite."""
+
+    def __init__(self, db_path=JOB_DB_PATH):
+        self._jobs = {}  # id -> record
+        self._order = []  # ids in creation order
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, created_at REAL, data TEXT)'
+            )
+            self._load()
+
+    def _load(self):
+        for job_id, data in self._db.execute('SELECT id, data FROM jobs ORDER BY created_at'):
+            job = json.loads(data)
+            if job['state'] not in FINAL_STATES.values():
+                # Whatever was queued or running died with the previous process.
+                job.update(state='failed', error='Interrupted by a server restart', finished_at=time.time())
+                self._save(job)
+            self._jobs[job_id] = job
+            self._order.append(job_id)
+
+    def _save(self, job):
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO jobs (id, created_at, data) VALUES (?, ?, ?)',
+                (job['id'], job['created_at'], json.dumps(job))
+            )
+
+    def create(self, job_id, **fields):
+        now = time.time()
+        job = {
+            'id': job_id,
+            'state': 'queued',
+            'stage': 'queued',
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'stage_durations': {},
+            'error': None,
+            'output_path': None,
+            **fields,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._order.append(job_id)
+            self._save(job)
+        return dict(job)
+
+    def transition(self, job_id, stage, **fields):
+        """
+        Moves a job to `stage`. Repeated reports of the current stage (e.g. rendering
+        percent) only update fields. Reports that would move the job back are ignored:
+        branches of a job report concurrently, and worker progress reaches the app
+        on its own queue and can arrive after the job was recorded as done.
+        Per-stage durations are passed in as stage_durations once the job is done.
+        """
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['state'] in FINAL_STATES.values() or moves_back(job, stage, fields.get('percent')):
+                return dict(job)
+            if stage != job['stage']:
+                job['stage'] = stage
+                if stage in FINAL_STATES:
+                    job['state'] = FINAL_STATES[stage]
+                    job['finished_at'] = now
+                elif job['state'] == 'queued':
+                    job['state'] = 'running'
+                    job['started_at'] = now
+            job.update(fields)
+            self._save(job)
+            return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, offset=0, limit=50):
+        """Jobs in creation order, newest first, and the total count."""
+        with self._lock:
+            total = len(self._order)
+            end = max(total - offset, 0)
+            ids = self._order[max(end - limit, 0):end]
+            return [dict(self._jobs[job_id]) for job_id in reversed(ids)], total
@@ -0,0 +1,160 @@
+"""
+keyframes.py
+
+Local slide-change detection, so Gemini reads a handful of images instead of a whole video.
+
+The video is decoded with PyAV and sampled at KEYFRAME_SAMPLE_FPS into small
+grayscale thumbnails. Consecutive thumbnails are compared in one vectorized
+NumPy pass: a sample where a large share of pixels changed starts a new slide,
+and runs shorter than MIN_SLIDE_SECONDS (a sheet being swapped) are dropped.
+A slide that is nearly identical to an earlier one (within
+KEYFRAME_DUPLICATE_FRACTION), or that only adds writing to it, is that sheet
+shown again and is merged into it. Each slide keeps the frame with the most
+writing on it, which is decoded in full and saved as a JPEG.
+
+Usage:
+    slides = detect_keyframes(video_path, os.path.join(workdir, "keyframes"))
+    for slide in slides:
+        slide["time"], slide["intervals"], slide["path"]
+"""
+
+import os
+
+import numpy as np
+
+KEYFRAME_SAMPLE_FPS = float(os.environ.get('KEYFRAME_SAMPLE_FPS', '1'))
+
+# Share of thumbnail pixels that must change between samples to count as a new slide.
+CHANGE_FRACTION = float(os.environ.get('KEYFRAME_CHANGE_FRACTION', '0.15'))
+
+# Share of thumbnail pixels within which a later slide is the same sheet shown again.
+DUPLICATE_FRACTION = float(os.environ.get('KEYFRAME_DUPLICATE_FRACTION', '0.03'))
+
+# Share of a sheet's ink that a later frame may lack and still count as extending it.
+INK_MISSING_FRACTION = 0.05
+
+# A pixel counts as changed when its gray level moves by more than this.
+PIXEL_DELTA = 32
+
+# Shorter runs are transitions (a hand swapping sheets), not slides.
+MIN_SLIDE_SECONDS = 2.0
+
+THUMB_SIZE = (160, 90)
+
+# Keyframes sent to the model are scaled down to this width.
+KEYFRAME_MAX_WIDTH = 1280
+
+def sample_thumbnails(video_path, fps=KEYFRAME_SAMPLE_FPS):
+    """Decodes the video and returns (thumbnails as an (N, h, w) uint8 array, sample times)."""
+    import av
+
+    width, height = THUMB_SIZE
+    thumbs, times = [], []
+    with av.open(video_path) as container:
+        if not container.streams.video:
+            return np.zeros((0, height, width), dtype=np.uint8), np.zeros(0)
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        next_time = 0.0
+        for frame in container.decode(stream):
+            if frame.time is None or frame.time < next_time:
+                continue
+            thumbs.append(frame.reformat(width=width, height=height, format='gray').to_ndarray())
+            times.append(frame.time)
+            next_time = frame.time + 1.0 / fps
+    if not thumbs:
+        return np.zeros((0, height, width), dtype=np.uint8), np.zeros(0)
+    return np.stack(thumbs), np.array(times)
+
+def changed_fraction(a, b):
+    """Share of pixels that differ by more than PIXEL_DELTA, per pair of (broadcast) thumbnails."""
+    delta = np.abs(a.astype(np.int16) - b.astype(np.int16))
+    return (delta > PIXEL_DELTA).mean(axis=(-2, -1))
+
+def ink(thumb):
+    """Pixels clearly darker than the sheet (the median gray level)."""
+    return thumb.astype(np.int16) < int(np.median(thumb)) - PIXEL_DELTA
+
+def extends(old, new):
+    """Whether `new` is `old` with writing added: nearly all of old's ink is still there."""
+    old_ink = ink(old)
+    new_ink = ink(new)
+    # Let ink move by a pixel, for camera shake.
+    padded = np.pad(new_ink, 1)
+    height, width = new_ink.shape
+    near_ink = np.zeros_like(new_ink)
+    for dy in range(3):
+        for dx in range(3):
+            near_ink |= padded[dy:dy + height, dx:dx + width]
+    missing = np.count_nonzero(old_ink & ~near_ink)
+    return missing <= INK_MISSING_FRACTION * np.count_nonzero(old_ink)
+
+def find_slides(thumbs, times, fps=KEYFRAME_SAMPLE_FPS):
+    """
+    Groups samples into slides. Returns [{"frame": index of the representative
+    sample, "intervals": [(start, end), ...]}] in order of first appearance.
+    """
+    if len(thumbs) == 0:
+        return []
+    boundaries = np.flatnonzero(changed_fraction(thumbs[1:], thumbs[:-1]) > CHANGE_FRACTION) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(thumbs)]))
+    end_times = np.append(times[1:], times[-1] + 1.0 / fps)
+
+    slides = []
+    for start, end in zip(starts, ends):
+        interval = (float(times[start]), float(end_times[end - 1]))
+        if interval[1] - interval[0] < MIN_SLIDE_SECONDS:
+            continue
+        frame = end - 1
+        if slides:
+            # A slide close to an earlier one is that sheet shown again if it is
+            # nearly identical or only adds writing; otherwise both are kept.
+            kept = np.stack([thumbs[slide['frame']] for slide in slides])
+            differences = changed_fraction(kept, thumbs[frame])
+            match = int(np.argmin(differences))
+            if differences[match] <= CHANGE_FRACTION:
+                added = extends(kept[match], thumbs[frame])
+                if added or differences[match] <= DUPLICATE_FRACTION:
+                    if added:
+                        slides[match]['frame'] = frame
+                    slides[match]['intervals'].append(interval)
+                    continue
+        slides.append({'frame': frame, 'intervals': [interval]})
+    return slides
+
+def save_frames(video_path, times, directory):
+    """Decodes the frames at the given times in full and saves them as JPEGs; returns the paths."""
+    import av
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        for t in sorted(set(times)):
+            container.seek(int(t / stream.time_base), stream=stream)
+            for frame in container.decode(stream):
+                if frame.time is not None and frame.time >= t - 1e-3:
+                    image = frame.to_image()
+                    if image.width > KEYFRAME_MAX_WIDTH:
+                        image = image.resize((KEYFRAME_MAX_WIDTH, round(image.height * KEYFRAME_MAX_WIDTH / image.width)))
+                    path = os.path.join(directory, f'frame_{t:09.2f}.jpg')
+                    image.save(path, quality=85)
+                    paths[t] = path
+                    break
+    return [paths.get(t) for t in times]
+
+def detect_keyframes(video_path, directory, fps=KEYFRAME_SAMPLE_FPS):
+    """
+    Finds the slides of a video and saves one keyframe per slide in `directory`.
+    Returns [{"time": first shown, "intervals": [(start, end), ...], "path": jpeg}]
+    in order of first appearance.
+    """
+    thumbs, times = sample_thumbnails(video_path, fps)
+    slides = find_slides(thumbs, times, fps)
+    frame_times = [float(times[slide['frame']]) for slide in slides]
+    paths = save_frames(video_path, frame_times, directory) if slides else []
+    return [
+        {'time': slide['intervals'][0][0], 'intervals': slide['intervals'], 'path': path}
+        for slide, path in zip(slides, paths) if path
+    ]
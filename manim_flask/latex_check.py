@@ -0,0 +1,176 @@
+"""
+latex_check.py
+
+Local, batched LaTeX validation of the Tex/MathTex strings of a scene.
+
+Every unit (the strings of one Tex or MathTex mobject) is placed in one LaTeX
+document, on its own lines and in the environment manim would use, and the
+document is compiled once in nonstop mode. Errors are mapped back to units by
+line number, so a scene whose LaTeX is fine costs one local compile, and only
+the units that actually fail need to be repaired. Unbalanced braces are caught
+before compiling, since they would swallow every unit after them.
+
+A BackgroundCheck compiles units while a scene is still being streamed, in
+batches of whatever has arrived since its last compile; find_errors then only
+compiles the units it hasn't seen.
+
+Usage:
+    errors = find_errors(spec.tex_units())   # None: no local LaTeX, {}: everything compiles
+    for unit, message in errors.items(): ...
+
+    check = BackgroundCheck()
+    check.submit(unit)                       # as each unit streams in
+    errors = find_errors(spec.tex_units(), known=check.results())
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+LATEX_CHECK_TIMEOUT = 60
+
+# Used when manim's own template can't be loaded; it matches manim's default preamble.
+FALLBACK_TEMPLATE = r"""\documentclass[preview]{standalone}
+\usepackage[english]{babel}
+\usepackage{amsmath}
+\usepackage{amssymb}
+\begin{document}
+YourTextHere
+\end{document}
+"""
+
+ERROR_LINE = re.compile(r'^\S*check\.tex:(\d+): (.*)$', re.MULTILINE)
+
+def unit_key(unit):
+    return unit['kind'], tuple(unit['strings'])
+
+def braces_balanced(text):
+    depth = 0
+    for char in re.sub(r'\\[\\{}]', '', text):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+def _template():
+    """(document with a placeholder, placeholder, compiler) from manim's TeX template."""
+    try:
+        from manim import config
+        template = config['tex_template']
+        return template.body, template.placeholder_text, template.tex_compiler
+    except Exception:
+        return FALLBACK_TEMPLATE, 'YourTextHere', 'latex'
+
+def _document(units, template, placeholder):
+    """The batch document, and the first line of each unit in it."""
+    head, tail = template.split(placeholder, 1)
+    line = head.count('\n') + 1
+    parts, first_lines = [], []
+    for unit in units:
+        expression = ' '.join(unit['strings'])
+        if unit['kind'] == 'MathTex':
+            block = '\\begin{align*}\n' + expression + '\n\\end{align*}\n\n'
+        else:
+            block = '\\begin{center}\n' + expression + '\n\\end{center}\n\n'
+        first_lines.append(line)
+        parts.append(block)
+        line += block.count('\n')
+    return head + ''.join(parts) + tail, first_lines
+
+def find_errors(units, known=None):
+    """
+    Compiles units ({'kind': 'Tex' or 'MathTex', 'strings': [...]}) and returns
+    {index: error message} for those that fail, {} when all compile, or None
+    when no local LaTeX check is possible.
+    known maps unit_key(unit) to an already found error message ('' if the
+    unit compiles); those units aren't compiled again.
+    """
+    known = known or {}
+    errors = {}
+    batch = []  # indexes of the units that go to LaTeX
+    for index, unit in enumerate(units):
+        key = unit_key(unit)
+        if key in known:
+            if known[key]:
+                errors[index] = known[key]
+        elif all(braces_balanced(text) for text in unit['strings']):
+            batch.append(index)
+        else:
+            errors[index] = 'Unbalanced braces'
+    if not batch:
+        return dict(sorted(errors.items()))
+
+    template, placeholder, compiler = _template()
+    if shutil.which(compiler) is None:
+        return None
+    document, first_lines = _document([units[index] for index in batch], template, placeholder)
+    workdir = tempfile.mkdtemp(prefix='latex-check-')
+    try:
+        with open(os.path.join(workdir, 'check.tex'), 'w', encoding='utf-8') as f:
+            f.write(document)
+        result = subprocess.run(
+            [compiler, '-interaction=nonstopmode', '-file-line-error', 'check.tex'],
+            cwd=workdir, capture_output=True, timeout=LATEX_CHECK_TIMEOUT
+        )
+        try:
+            with open(os.path.join(workdir, 'check.log'), encoding='utf-8', errors='replace') as f:
+                log = f.read()
+        except FileNotFoundError:
+            return None
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    compile_errors = {}
+    for match in ERROR_LINE.finditer(log):
+        line = int(match.group(1))
+        # An error belongs to the last unit that starts at or before its line.
+        position = max((i for i, first in enumerate(first_lines) if first <= line), default=None)
+        if position is not None:
+            compile_errors.setdefault(batch[position], match.group(2).strip())
+    if result.returncode != 0 and not compile_errors:
+        return None  # failed without a usable error line (e.g. a broken preamble)
+    errors.update(compile_errors)
+    return dict(sorted(errors.items()))
+
+class BackgroundCheck:
+    """
+    Compiles units on a background thread as they are submitted. Units that
+    arrive while a compile runs are checked together in the next one.
+    """
+
+    def __init__(self):
+        self.known = {}  # unit_key -> error message, '' when the unit compiles
+        self._pending = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, unit):
+        with self._lock:
+            self._pending.append(unit)
+        self._executor.submit(self._check_pending)
+
+    def _check_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        batch = [unit for unit in batch if unit_key(unit) not in self.known]
+        if not batch:
+            return
+        errors = find_errors(batch)
+        if errors is None:
+            return
+        for index, unit in enumerate(batch):
+            self.known[unit_key(unit)] = errors.get(index, '')
+
+    def results(self):
+        """Waits for the submitted units and returns what is known about them (see find_errors)."""
+        self._executor.shutdown(wait=True)
+        return self.known
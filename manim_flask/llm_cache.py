@@ -0,0 +1,154 @@
+"""
+llm_cache.py
+
+An on-disk, content-addressed cache of raw Gemini responses.
+
+Entries are keyed by (sha256 of the input, model name, prompt text), so a
+repeated upload of the same lecture skips the network entirely, while editing
+one stage's prompt only invalidates that stage. Entries older than the maximum
+age are dropped, and the least recently used ones go when the cache is over size.
+
+Usage:
+    text = cached(sha256_file(video_path), "gemini-1.5-pro", prompt,
+                  lambda: model.generate_content(...).text)
+    for chunk in cached_stream(input_hash, model_name, prompt, lambda: stream_text(...)):
+        ...   # a hit yields the whole text at once
+"""
+
+import os
+import time
+import hashlib
+
+from atomic_files import atomic_path
+
+LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', os.path.join('media', 'llm_cache'))
+LLM_CACHE_MAX_MB = int(os.environ.get('LLM_CACHE_MAX_MB', '256'))
+LLM_CACHE_MAX_AGE_DAYS = float(os.environ.get('LLM_CACHE_MAX_AGE_DAYS', '30'))
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Hashes a file's bytes without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Raw response texts stored one file per key, shared by all worker processes."""
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                 max_age=LLM_CACHE_MAX_AGE_DAYS * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, input_hash, model_name, prompt):
+        return sha256_text('\0'.join([input_hash, model_name, prompt]))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.txt')
+
+    def get(self, key):
+        """Returns the cached text for key, or None if it is missing or expired."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            # The modification time doubles as the last-used time for eviction.
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        """Stores text under key with an atomic rename, then trims the cache."""
+        path = self._path(key)
+        with atomic_path(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.evict()
+
+    def evict(self):
+        """Removes expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.txt'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime > self.max_age:
+                        os.remove(path)
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, path))
+                except FileNotFoundError:
+                    pass  # removed by another worker
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def discard(self, input_hash, model_name, prompt):
+        """Drops an entry, e.g. a response that turned out to be unusable."""
+        try:
+            os.remove(self._path(self.key(input_hash, model_name, prompt)))
+        except FileNotFoundError:
+            pass
+
+    def cached(self, input_hash, model_name, prompt, generate):
+        """Returns the cached response for the key, calling generate() only on a miss."""
+        key = self.key(input_hash, model_name, prompt)
+        text = self.get(key)
+        if text is not None:
+            self.hits += 1
+            print(f"LLM cache hit for {model_name}")
+            return text
+        self.misses += 1
+        text = generate()
+        if text:
+            self.put(key, text)
+        return text
+
+    def cached_stream(self, input_hash, model_name, prompt, generate_stream):
+        """
+        Like cached(), for a response that arrives in chunks: yields the cached
+        text as one chunk, or on a miss each chunk of generate_stream() as it
+        arrives. The joined response is stored once the stream has completed.
+        """
+        key = self.key(input_hash, model_name, prompt)
+        text = self.get(key)
+        if text is not None:
+            self.hits += 1
+            print(f"LLM cache hit for {model_name}")
+            yield text
+            return
+        self.misses += 1
+        chunks = []
+        for chunk in generate_stream():
+            chunks.append(chunk)
+            yield chunk
+        text = ''.join(chunks)
+        if text:
+            self.put(key, text)
+
+cache = ResponseCache()
+
+def cached(input_hash, model_name, prompt, generate):
+    return cache.cached(input_hash, model_name, prompt, generate)
+
+def cached_stream(input_hash, model_name, prompt, generate_stream):
+    return cache.cached_stream(input_hash, model_name, prompt, generate_stream)
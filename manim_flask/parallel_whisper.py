@@ -0,0 +1,163 @@
+"""
+parallel_whisper.py
+
+Chunked, parallel Whisper transcription of long recordings.
+
+A single model.transcribe() call walks the audio one 30-second window after
+another on one process. For long lectures, transcribe_parallel() cuts the
+extracted 16 kHz track at its quietest moments into chunks of at most
+WHISPER_CHUNK_SECONDS, skips chunks with no voice activity, transcribes the
+rest on a pool of processes that each load the Whisper model once, and
+stitches the segments back together on the original timeline. The pool lives
+for one call and is sized so its models fit in WHISPER_MEMORY_BUDGET_MB next
+to the ones this process already holds.
+
+Usage:
+    result = transcribe_parallel(audio_path, "base")
+    result["text"]       # the whole transcript, as model.transcribe() would give
+    result["segments"]   # [{"start": 0.0, "end": 4.2, "text": "..."}, ...]
+"""
+
+import os
+import wave
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import whisper_models
+from audio_extract import AUDIO_SAMPLE_RATE, load_audio
+
+def _default_processes():
+    # Share the cores between the render workers that may transcribe at once.
+    workers = int(os.environ.get('RENDER_WORKERS', '2'))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+# Transcription processes per render worker, overridable from the environment.
+WHISPER_PROCESSES = int(os.environ.get('WHISPER_PROCESSES', '0')) or _default_processes()
+
+# Longest chunk handed to one process; cuts fall in the quietest part of its second half.
+WHISPER_CHUNK_SECONDS = float(os.environ.get('WHISPER_CHUNK_SECONDS', '120'))
+
+# Recordings shorter than this are transcribed in one sequential pass.
+WHISPER_PARALLEL_MIN_SECONDS = float(os.environ.get('WHISPER_PARALLEL_MIN_SECONDS', '300'))
+
+# Energy analysis: 30 ms frames, smoothed over 0.5 s when looking for pauses.
+FRAME_SECONDS = 0.03
+PAUSE_SECONDS = 0.5
+
+# Frames below this RMS level (about -46 dBFS) count as silence.
+SILENCE_RMS = 0.005
+
+def frame_energy(samples, sample_rate=AUDIO_SAMPLE_RATE):
+    """RMS level of each FRAME_SECONDS frame."""
+    frame = int(sample_rate * FRAME_SECONDS)
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(1, dtype=np.float32)
+    frames = samples[:count * frame].reshape(count, frame)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+def speech_chunks(samples, sample_rate=AUDIO_SAMPLE_RATE, max_seconds=WHISPER_CHUNK_SECONDS):
+    """
+    Splits a recording into (start, end) sample ranges of at most max_seconds,
+    cutting at the middle of the quietest pause, and drops ranges without speech.
+    """
+    frame = int(sample_rate * FRAME_SECONDS)
+    energy = frame_energy(samples, sample_rate)
+    width = max(1, int(PAUSE_SECONDS / FRAME_SECONDS))
+    smoothed = np.convolve(energy, np.ones(width) / width, mode='same')
+    max_frames = max(2, int(max_seconds / FRAME_SECONDS))
+
+    cuts = [0]
+    while len(energy) - cuts[-1] > max_frames:
+        lo = cuts[-1] + max_frames // 2
+        hi = cuts[-1] + max_frames
+        cuts.append(lo + int(np.argmin(smoothed[lo:hi])))
+    cuts.append(len(energy))
+
+    chunks = []
+    for first, last in zip(cuts, cuts[1:]):
+        if energy[first:last].max(initial=0) >= SILENCE_RMS:
+            end = len(samples) if last == len(energy) else last * frame
+            chunks.append((first * frame, end))
+    return chunks
+
+def read_samples(audio_path, start, end):
+    """Samples [start, end) of a 16-bit mono WAV file as float32."""
+    with wave.open(audio_path, 'rb') as f:
+        f.setpos(start)
+        pcm = np.frombuffer(f.readframes(end - start), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+def _init_worker(threads, model_size):
+    """Pool initializer: splits the cores between workers and loads the model once."""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass  # without torch there is no Whisper either; preload() reports it
+    whisper_models.preload(model_size)
+
+def _transcribe_chunk(audio_path, start, end, model_size, language):
+    # Workers read their own slice, so no audio crosses the process boundary.
+    model = whisper_models.get_model(model_size)
+    result = model.transcribe(read_samples(audio_path, start, end), language=language)
+    segments = [
+        {'start': seg['start'], 'end': seg['end'], 'text': seg['text'].strip()}
+        for seg in result['segments']
+    ]
+    return segments, result.get('language')
+
+def pool_processes(model_size, chunk_count):
+    """Processes for one transcription: no more than the chunks, or than the models that fit in the memory budget."""
+    registry = whisper_models.registry
+    free = registry.budget_bytes - registry.resident_bytes()
+    fit = free // whisper_models.estimate_model_bytes(model_size)
+    return max(1, min(WHISPER_PROCESSES, chunk_count, fit))
+
+def transcribe_parallel(audio_path, model_size=whisper_models.DEFAULT_WHISPER_MODEL,
+                        language=None, progress=None):
+    """
+    Transcribes a WAV file written by extract_audio() across a process pool and returns
+    {"text", "segments", "language"} with segment times on the full recording.
+    progress(done, total) is called as chunks finish.
+    """
+    samples = load_audio(audio_path)
+    chunks = speech_chunks(samples)
+    del samples
+    if not chunks:
+        return {'text': '', 'segments': [], 'language': language}
+
+    if model_size not in whisper_models.MODEL_PARAMS_M:
+        raise ValueError(f"Unknown Whisper model: {model_size}")
+    processes = pool_processes(model_size, len(chunks))
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(threads, model_size),
+    ) as pool:
+        # Without a language, each chunk detects its own from its first 30 seconds.
+        futures = [
+            pool.submit(_transcribe_chunk, audio_path, start, end, model_size, language)
+            for start, end in chunks
+        ]
+
+        segments = []
+        for index, ((start, end), future) in enumerate(zip(chunks, futures)):
+            offset = start / AUDIO_SAMPLE_RATE
+            chunk_end = end / AUDIO_SAMPLE_RATE
+            chunk_segments, chunk_language = future.result()
+            language = language or chunk_language
+            for seg in chunk_segments:
+                segments.append({
+                    'start': round(seg['start'] + offset, 2),
+                    'end': round(min(seg['end'] + offset, chunk_end), 2),
+                    'text': seg['text'],
+                })
+            if progress is not None:
+                progress(index + 1, len(chunks))
+    text = ' '.join(seg['text'] for seg in segments if seg['text'])
+    return {'text': text, 'segments': segments, 'language': language}
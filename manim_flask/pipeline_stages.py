@@ -0,0 +1,108 @@
+"""
+pipeline_stages.py
+
+A small scheduler for pipeline stages that depend on each other.
+
+Every stage starts on its own thread as soon as the stages it depends on have
+finished, so independent branches (e.g. the Gemini upload/transcription and the
+local Whisper pass) overlap and a job takes about as long as its slowest branch.
+
+A Channel hands results over item by item, so a consuming stage can start on
+the first item (e.g. a slide) while the producing stage is still streaming.
+
+Usage:
+    stages = StageScheduler()
+    stages.add("upload", lambda: process_video(path))
+    stages.add("transcribe_video", transcribe_video, after=["upload"])
+    stages.add("transcribe_audio", lambda: transcribe_audio_segments(path))
+    results = stages.run()  # {"upload": ..., "transcribe_video": ..., ...}
+
+    slides = Channel()
+    stages.add("transcribe", lambda: stream_slides_into(slides))   # slides.put(...), then slides.close()
+    stages.add("scenes", lambda: [build(slide) for slide in slides])
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+class Channel:
+    """
+    Items passed from one stage to another as they are produced. The producer
+    must close() the channel, with the error if it failed; iterating yields
+    every item put so far and then blocks until the next one or the close.
+    """
+
+    def __init__(self):
+        self.items = []
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def put(self, item):
+        with self._condition:
+            self.items.append(item)
+            self._condition.notify_all()
+
+    def close(self, error=None):
+        with self._condition:
+            self._closed = True
+            self._error = error
+            self._condition.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self.items) or self._closed)
+                if index >= len(self.items):
+                    if self._error is not None:
+                        raise self._error
+                    return
+                item = self.items[index]
+            index += 1
+            yield item
+
+class StageScheduler:
+    """Runs named stages concurrently, each after the stages listed in `after`."""
+
+    def __init__(self):
+        self._stages = []  # (name, fn, after) in the order they were added
+        self.timings = {}  # name -> seconds
+
+    def add(self, name, fn, after=()):
+        """
+        Adds a stage. fn is called with the results of the `after` stages, in order.
+        Dependencies must be added before the stages that use them.
+        """
+        known = {stage[0] for stage in self._stages}
+        if name in known:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [dep for dep in after if dep not in known]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self._stages.append((name, fn, tuple(after)))
+
+    def run(self):
+        """Runs all stages and returns {name: result}. Re-raises the first stage failure."""
+        futures = {}
+        # One thread per stage: a stage blocked on its dependencies never starves another.
+        with ThreadPoolExecutor(max_workers=max(len(self._stages), 1)) as executor:
+            for name, fn, after in self._stages:
+                deps = [futures[dep] for dep in after]
+                futures[name] = executor.submit(self._run_stage, name, fn, deps)
+            done, not_done = wait(futures.values(), return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+        return {name: future.result() for name, future in futures.items()}
+
+    def _run_stage(self, name, fn, deps):
+        args = [dep.result() for dep in deps]
+        start = time.monotonic()
+        result = fn(*args)
+        self.timings[name] = time.monotonic() - start
+        print(f"Stage {name} finished in {self.timings[name]:.1f}s")
+        return result
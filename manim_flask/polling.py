@@ -0,0 +1,69 @@
+"""
+polling.py
+
+Exponential backoff with jitter for waiting on remote state, e.g. a Gemini
+file leaving PROCESSING. Short waits are noticed within a fraction of a second,
+long waits make few calls, and an overall deadline bounds the total wait.
+
+Usage:
+    video_file, stats = poll_until(lambda: genai.get_file(name),
+                                   lambda f: f.state.name != "PROCESSING",
+                                   initial=first_file)
+"""
+
+import os
+import time
+import random
+
+POLL_INITIAL_INTERVAL = float(os.environ.get('POLL_INITIAL_INTERVAL', '0.5'))
+POLL_MAX_INTERVAL = float(os.environ.get('POLL_MAX_INTERVAL', '8'))
+POLL_DEADLINE = float(os.environ.get('POLL_DEADLINE', '900'))
+
+class BackoffPolicy:
+    """Sleep intervals growing by `factor` from `initial` up to `max_interval`, +/- `jitter`."""
+
+    def __init__(self, initial=POLL_INITIAL_INTERVAL, factor=2.0, max_interval=POLL_MAX_INTERVAL,
+                 deadline=POLL_DEADLINE, jitter=0.2):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def intervals(self, rng=random):
+        interval = self.initial
+        while True:
+            yield interval * (1 + rng.uniform(-self.jitter, self.jitter))
+            interval = min(interval * self.factor, self.max_interval)
+
+    def as_dict(self):
+        return {
+            'initial': self.initial,
+            'factor': self.factor,
+            'max_interval': self.max_interval,
+            'deadline': self.deadline,
+            'jitter': self.jitter,
+        }
+
+def poll_until(check, is_done, policy=None, initial=None, sleep=time.sleep, clock=time.monotonic):
+    """
+    Calls check() with backoff until is_done(result) and returns (result, stats).
+    If `initial` is given it is tested first, without a call.
+    Raises TimeoutError once the policy's deadline has passed.
+    """
+    policy = policy or BackoffPolicy()
+    start = clock()
+    stats = {'polls': 0, 'waited': 0.0, 'policy': policy.as_dict()}
+    result = initial if initial is not None else check()
+    for interval in policy.intervals():
+        if is_done(result):
+            break
+        remaining = policy.deadline - (clock() - start)
+        if remaining <= 0:
+            stats['waited'] = clock() - start
+            raise TimeoutError(f"Still waiting after {policy.deadline:.0f}s ({stats['polls']} polls)")
+        sleep(min(interval, remaining))
+        result = check()
+        stats['polls'] += 1
+    stats['waited'] = clock() - start
+    return result, stats
@@ -0,0 +1,98 @@
+"""
+progress.py
+
+Per-job progress events for the Flask app, pushed to clients as they happen.
+
+Render workers report stage transitions (queued, analyzing, uploading,
+transcribing, json, narrating, latex-check, rendering with percent, done,
+failed); the app publishes them here and the /events endpoint streams them to
+the browser as server-sent events. Branches of a job run concurrently, so a
+report of a stage the job has already moved past is dropped rather than shown
+as the job going back.
+
+Usage:
+    broker.publish(job_id, "rendering", percent=40)
+    for event in broker.events(job_id):   # blocks until new events arrive
+        ...
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+TERMINAL_STAGES = ('done', 'failed')
+
+# Stages in pipeline order.
+STAGES = ('queued', 'analyzing', 'uploading', 'transcribing', 'json', 'narrating', 'latex-check', 'rendering',
+          *TERMINAL_STAGES)
+
+def moves_back(latest, stage, percent=None):
+    """Whether reporting `stage` would move a job back from `latest` (its last event or record): an earlier stage, or a lower percent of the same one."""
+    if latest is None or stage not in STAGES or latest['stage'] not in STAGES:
+        return False
+    if stage != latest['stage']:
+        return STAGES.index(stage) < STAGES.index(latest['stage'])
+    return percent is not None and latest.get('percent') is not None and percent < latest['percent']
+
+class ProgressBroker:
+    """Keeps the event history of the most recent jobs and wakes up waiting streams."""
+
+    def __init__(self, max_jobs=1000):
+        self.max_jobs = max_jobs
+        self._events = OrderedDict()  # job_id -> [event, ...]
+        self._cond = threading.Condition()
+
+    def publish(self, job_id, stage, **info):
+        """Adds an event to the job's history; events that would move the job back (late worker reports) are dropped."""
+        event = {'stage': stage, 'time': time.time(), **info}
+        with self._cond:
+            if job_id not in self._events:
+                self._events[job_id] = []
+                while len(self._events) > self.max_jobs:
+                    self._events.popitem(last=False)
+            elif self._events[job_id]:
+                latest = self._events[job_id][-1]
+                if latest['stage'] in TERMINAL_STAGES or moves_back(latest, stage, info.get('percent')):
+                    return
+            self._events[job_id].append(event)
+            self._cond.notify_all()
+
+    def latest(self, job_id):
+        with self._cond:
+            history = self._events.get(job_id)
+            return history[-1] if history else None
+
+    def events(self, job_id, start=0, keepalive=15):
+        """
+        Yields (index, event) for the job from `start` on, waiting for new ones,
+        until a terminal event. Yields (None, None) every `keepalive` seconds of silence.
+        """
+        index = start
+        while True:
+            with self._cond:
+                history = self._events.get(job_id, [])
+                if index >= len(history) and history and history[-1]['stage'] in TERMINAL_STAGES:
+                    return  # a reconnect after the job already finished
+                if index >= len(history):
+                    self._cond.wait(timeout=keepalive)
+                    history = self._events.get(job_id, [])
+                new_events = history[index:]
+            if not new_events:
+                yield None, None
+                continue
+            for event in new_events:
+                yield index, event
+                index += 1
+                if event['stage'] in TERMINAL_STAGES:
+                    return
+
+def sse_stream(broker, job_id, start=0):
+    """Formats a job's events as a text/event-stream body."""
+    for index, event in broker.events(job_id, start):
+        if event is None:
+            yield ': keepalive\n\n'
+        else:
+            yield f"id: {index}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+
+broker = ProgressBroker()
@@ -0,0 +1,136 @@
+"""
+render_pool.py
+
+A pool of long-lived, pre-warmed worker processes for the video -> Manim pipeline.
+
+Each worker loads script-code.py once (and with it manim, numpy,
+google.generativeai, whisper and the default Whisper model), so a job only pays for its own work
+instead of a fresh interpreter start and all of those imports.
+
+Usage:
+    pool = RenderPool(workers=2)
+    pool.start()
+    future = pool.submit(video_url, output_path)
+    future.result()  # {'output_path': ..., 'metrics': ...}
+"""
+
+import os
+import importlib.util
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+PIPELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'script-code.py')
+
+# Number of worker processes, overridable from the environment.
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '2'))
+
+# The pipeline module of the current worker process, the start-up barrier
+# shared by all workers and the queue for progress reports (set by _warm_worker).
+_pipeline = None
+_ready = None
+_progress = None
+
+def load_pipeline():
+    """Imports script-code.py as a module (its file name is not a valid module name)."""
+    spec = importlib.util.spec_from_file_location('script_code', PIPELINE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _warm_worker(ready, progress):
+    """Pool initializer: imports the pipeline and its heavy dependencies once per worker."""
+    global _pipeline, _ready, _progress
+    _ready = ready
+    _progress = progress
+    _pipeline = load_pipeline()
+    _pipeline.whisper_models.preload(_pipeline.DEFAULT_WHISPER_MODEL)
+
+def _ping():
+    # Blocks until every worker is up, so the executor can't hand all pings to
+    # the first idle worker and leave the rest of the pool unstarted.
+    _ready.wait()
+    return os.getpid()
+
+def _run_job(video_url, output_path, options):
+    job_id = options.get('job_id')
+    metrics = {}
+    output_path = _pipeline.run_pipeline(
+        video_url, output_path, metrics=metrics,
+        progress=lambda stage, **info: _progress.put((job_id, stage, info)),
+        **options
+    )
+    return {'output_path': output_path, 'metrics': metrics}
+
+class RenderPool:
+    """A fixed-size pool of worker processes that run pipeline jobs from a queue."""
+
+    def __init__(self, workers=RENDER_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._progress = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_progress_listener(self, listener):
+        """Registers listener(job_id, stage, info) for progress reported by the workers."""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Starts all workers and waits until each one has imported the pipeline."""
+        with self._lock:
+            if self._executor is None:
+                self._start_workers()
+
+    def _start_workers(self):
+        # spawn rather than fork: torch and grpc don't survive a fork from a threaded parent.
+        context = multiprocessing.get_context('spawn')
+        self._progress = context.Queue()
+        threading.Thread(target=self._forward_progress, args=(self._progress,), daemon=True).start()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_warm_worker,
+            initargs=(context.Barrier(self.workers), self._progress),
+        )
+        wait([self._executor.submit(_ping) for _ in range(self.workers)])
+        print(f"Render pool ready with {self.workers} workers")
+
+    def submit(self, video_url, output_path, **options):
+        """
+        Queues a job and returns a Future resolving to
+        {'output_path': rendered video path, 'metrics': job metrics}.
+        Keyword options are passed on to run_pipeline (e.g. whisper_model="small").
+        A worker that died (e.g. killed for running out of memory) breaks the
+        whole executor, so in that case the pool is restarted before queueing.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._start_workers()
+            try:
+                return self._executor.submit(_run_job, video_url, output_path, options)
+            except BrokenProcessPool:
+                print("A render worker died; restarting the render pool")
+                self._stop_workers(wait=False)
+                self._start_workers()
+                return self._executor.submit(_run_job, video_url, output_path, options)
+
+    def _forward_progress(self, progress):
+        while True:
+            item = progress.get()
+            if item is None:
+                return
+            job_id, stage, info = item
+            for listener in self._listeners:
+                listener(job_id, stage, info)
+
+    def _stop_workers(self, wait):
+        self._executor.shutdown(wait=wait)
+        self._progress.put(None)
+        self._executor = None
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._stop_workers(wait)
@@ -0,0 +1,112 @@
+"""
+response_stream.py
+
+Incremental parsers for model responses that arrive in chunks.
+
+Each parser is fed the chunks of one streamed response and returns the items
+completed by every chunk, so the next pipeline stage can start on a slide or a
+scene element while the model is still writing the rest:
+
+    SlideStream     <slideN>...</slideN> blocks of a visual transcript
+    ElementStream   the element objects of a scene spec (and its title, when
+                    it comes before the elements)
+
+Both keep the whole text in .text, for caching and for the final full parse.
+
+Usage:
+    slides = SlideStream()
+    for chunk in response_chunks:
+        for slide in slides.feed(chunk):
+            start_scene(slide)
+"""
+
+import re
+
+from spec_parser import parse_spec
+
+SLIDE_PATTERN = re.compile(r'<slide\d+>(.*?)</slide\d+>', re.DOTALL)
+ELEMENTS_KEY = re.compile(r'''["']?elements["']?\s*:\s*\Z''')
+
+class SlideStream:
+    """Slides of a streamed transcript, each returned once its closing tag has arrived."""
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+
+    def feed(self, chunk):
+        """Adds a chunk; returns the slide texts completed by it."""
+        self.text += chunk
+        slides = []
+        for match in SLIDE_PATTERN.finditer(self.text, self._pos):
+            slides.append(match.group(1))
+            self._pos = match.end()
+        return slides
+
+class ElementStream:
+    """Element objects of a streamed scene spec, each parsed once its closing brace has arrived."""
+
+    def __init__(self):
+        self.text = ''
+        self.title = None
+        self._pos = 0
+        self._stack = []      # the '{' and '[' still open at _pos
+        self._quote = None    # the quote character of the string _pos is in
+        self._escaped = False
+        self._object_start = None
+        self._element_start = None
+
+    def feed(self, chunk):
+        """Adds a chunk; returns the element dicts completed by it (ones that don't parse are left to the full parse)."""
+        self.text += chunk
+        text = self.text
+        elements = []
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+            elif not self._stack:
+                # Text before the object (e.g. a ```json fence) may contain stray quotes.
+                if char == '{':
+                    self._object_start = pos
+                    self._stack.append(char)
+            elif char in '"\'':
+                self._quote = char
+            elif char in '{[':
+                if char == '[' and self._stack == ['{']:
+                    self._read_title(pos)
+                elif char == '{' and self._stack == ['{', '[']:
+                    self._element_start = pos
+                self._stack.append(char)
+            elif char in '}]':
+                self._stack.pop()
+                if char == '}' and self._element_start is not None and self._stack == ['{', '[']:
+                    element = self._parse(text[self._element_start:pos + 1])
+                    if isinstance(element, dict):
+                        elements.append(element)
+                    self._element_start = None
+        self._pos = len(text)
+        return elements
+
+    def _read_title(self, bracket):
+        """When the elements list opens, parses the keys before it to pick up the title."""
+        if self.title is not None:
+            return
+        key = ELEMENTS_KEY.search(self.text, self._object_start, bracket)
+        if key is None:
+            return
+        head = self._parse(self.text[self._object_start:key.start()] + '}')
+        if isinstance(head, dict) and isinstance(head.get('title'), str):
+            self.title = head['title']
+
+    @staticmethod
+    def _parse(text):
+        try:
+            return parse_spec(text)
+        except ValueError:
+            return None
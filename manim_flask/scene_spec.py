@@ -0,0 +1,109 @@
+"""
+scene_spec.py
+
+The structured form of a generated scene: a title plus a list of elements.
+
+The spec parsed from the model's JSON is the single source of truth for a
+scene. Checks and repairs work on its strings (element by element), and the
+Manim code is generated from it once, at the end, with every string written as
+a proper Python literal, so the generated file always compiles.
+
+SceneModel is the same shape as a pydantic model. It is sent to Gemini as the
+response schema, so the model returns JSON that validates against it.
+
+Usage:
+    spec = SceneSpec.from_dict({"title": "...", "elements": [{"type": "tex", "content": [...], "speak": [...]}]})
+    spec = SceneSpec.from_dict(SceneModel.model_validate_json(response_text).model_dump())
+    spec.patch(2, ["fixed line"])   # unit 0 is the title, unit i + 1 is element i
+    code = generate_manim_code(spec)   # in script-code.py
+"""
+
+from dataclasses import dataclass, field
+
+from pydantic import BaseModel
+
+ELEMENT_TYPES = ('tex', 'math')
+
+def literal(text):
+    """A Python string literal for `text`, in the raw-string style of the generated code where possible."""
+    if '"' not in text and '\n' not in text and '\r' not in text and not text.endswith('\\'):
+        return 'r"' + text + '"'
+    return repr(text)
+
+# No defaults or constraints here: Gemini's schema format doesn't accept them.
+# The element type and non-empty content are checked by SceneSpec.from_dict.
+class ElementModel(BaseModel):
+    type: str
+    content: list[str]
+    speak: list[str]
+
+class SceneModel(BaseModel):
+    title: str
+    elements: list[ElementModel]
+
+@dataclass
+class Element:
+    type: str
+    content: list
+    speak: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data, index=0):
+        """Validates one parsed element (index is used in the error); raises ValueError when it doesn't have the expected shape."""
+        if not isinstance(data, dict) or data.get('type') not in ELEMENT_TYPES:
+            raise ValueError(f"Element {index} needs a type out of {ELEMENT_TYPES}")
+        content = data.get('content')
+        speak = data.get('speak', [])
+        if isinstance(content, str):
+            content = [content]
+        if isinstance(speak, str):
+            speak = [speak]
+        if not content or not isinstance(content, list) or not isinstance(speak, list) \
+                or not all(isinstance(line, str) for line in content + speak):
+            raise ValueError(f"Element {index} needs a list of content strings")
+        return cls(data['type'], list(content), list(speak))
+
+    @property
+    def tex_class(self):
+        """The Manim class that renders this element."""
+        return 'Tex' if self.type == 'tex' else 'MathTex'
+
+@dataclass
+class SceneSpec:
+    title: str
+    elements: list
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validates a parsed JSON scene; raises ValueError when it doesn't have the expected shape."""
+        if not isinstance(data, dict) or not isinstance(data.get('title'), str):
+            raise ValueError("Scene JSON needs a string title")
+        elements = [Element.from_dict(elem, index) for index, elem in enumerate(data.get('elements') or [])]
+        if not elements:
+            raise ValueError("Scene JSON has no elements")
+        return cls(data['title'], elements)
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'elements': [{'type': e.type, 'content': e.content, 'speak': e.speak} for e in self.elements],
+        }
+
+    def tex_units(self):
+        """Everything compiled by LaTeX, as {'kind', 'strings'}: the title, then each element."""
+        units = [{'kind': 'Tex', 'strings': [self.title]}]
+        units.extend({'kind': e.tex_class, 'strings': list(e.content)} for e in self.elements)
+        return units
+
+    def patch(self, unit, strings):
+        """Replaces the strings of one tex unit (0 is the title) with a repaired version."""
+        if unit == 0:
+            self.title = ' '.join(strings)
+        else:
+            self.elements[unit - 1].content = list(strings)
+
+    def map_strings(self, fn):
+        """Applies fn to the title and every content string."""
+        self.title = fn(self.title)
+        for element in self.elements:
+            element.content = [fn(line) for line in element.content]
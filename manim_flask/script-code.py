@@ -7,105 +7,115 @@ A script that:
   1. Uses Google Generative AI to process a local video file (e.g. sample.webm),
      extract transcriptions in an XML-like format,
   2. Extracts slide content from the transcription,
-  3. Generates structured JSON (with "content" and "speak" fields) for a Manim scene,
-  4. Optionally generates Manim scene code.
+  3. Transcribes the audio (speech) from the video with Whisper,
+  4. Generates structured JSON (with "content" and "speak" fields) for a Manim scene,
+     checks the generated Manim code for LaTeX/Python errors and renders it.
+
+The pipeline is importable: render_pool.py keeps it loaded in long-lived
+worker processes and calls run_pipeline() for each job.
+Model responses are streamed, so each slide goes on to scene generation as soon
+as it has been transcribed, and each scene element to the LaTeX check.
   
 Usage:
-    python3 script-code.py <video_file>
+    python3 script-code.py <video_file> [--per-slide]
 """
 
 import sys
 import os
-import time
-import ast
 import re
+import uuid
+import shutil
+import threading
+import itertools
 import subprocess
+import json
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from manim import *  # Ensure manim is installed
 
+import whisper_models
+from whisper_models import DEFAULT_WHISPER_MODEL
+import llm_cache
+from llm_cache import sha256_file, sha256_text
+from upload_index import GenaiFilesAPI, get_or_upload
+from polling import BackoffPolicy, poll_until
+import tex_cache
+import tts_cache
+import latex_check
+from scene_spec import SceneSpec, SceneModel, Element, literal
+from spec_parser import parse_spec
+from response_stream import SlideStream, ElementStream, SLIDE_PATTERN
+from audio_extract import extract_audio, load_audio, duration as audio_duration
+from keyframes import detect_keyframes
+from slide_alignment import align_segments
+from parallel_whisper import transcribe_parallel, WHISPER_PROCESSES, WHISPER_PARALLEL_MIN_SECONDS
+from atomic_files import atomic_path
+
+# Compile Tex/MathTex through the LaTeX/SVG cache shared by all workers.
+tex_cache.install()
+from pipeline_stages import StageScheduler, Channel
+
 #############################################
 # Section 1: Utility Functions
 #############################################
 
-def generate_manim_code(title, elements):
-    """Generates Manim scene code based on a title and a list of elements."""
+# Receives progress(stage, **info) updates for the job running in this process (see run_pipeline).
+_progress_listener = None
+
+def report_progress(stage, **info):
+    """Reports a stage transition of the current job, e.g. to the Flask app's progress stream."""
+    print(f"[PROGRESS] {stage} {info if info else ''}")
+    if _progress_listener is not None:
+        _progress_listener(stage, **info)
+
+def generate_manim_code(spec, narration=None):
+    """
+    Generates Manim scene code from a SceneSpec (title plus elements).
+    Every string is written as a Python literal, so the code always compiles.
+    Every mobject is built once; the camera is framed on the final layout
+    up front (without rendering frames) and then the elements are written in order.
+    narration optionally holds one {"path", "duration"} clip (or None) per element;
+    each clip is played as its element is written, and the Write lasts as long as the clip.
+    """
     code = f"""
 from manim import *
 
 class GeneratedScene(MovingCameraScene):
-    def get_final_camera_setup(self):
-        # Create all mobjects first
-        title = Tex(r"{title}", font_size=50).to_edge(UP)
-        content_elements = [title]
-        prev_mobject = title
-"""
-    # Generate code for each element
-    for idx, elem in enumerate(elements):
-        elem_type = elem['type']
-        content_lines = elem['content']
-        content_args = ", ".join([f'r"{line}"' for line in content_lines])
-        # Use Tex for 'tex' type and MathTex for math content
-        class_name = "Tex" if elem_type == "tex" else "MathTex"
-        font_size = 40 if elem_type == "tex" and idx < 2 else (36 if elem_type == "tex" else 40)
-        code += f"""
-        element{idx} = {class_name}({content_args}, font_size={font_size}).next_to(prev_mobject, DOWN, buff=0.5)
-        content_elements.append(element{idx})
-        prev_mobject = element{idx}
-"""
-    code += """
-        # Group all content elements
-        content = VGroup(*content_elements)
-        self.add(title)
-        title.set_opacity(0)
-        self.camera.auto_zoom([title], margin=1)
-        current_content = [title]
-        for element in content_elements[1:]:
-            self.add(element)
-            element.set_opacity(0)
-            current_content.append(element)
-        self.play(
-            self.camera.auto_zoom(
-                content,
-                margin=0.5,
-                animate=True
-            ).build(),
-            run_time=2
-        )
-        self.camera.frame.save_state()
-        self.camera.auto_zoom(content, margin=0.5)
-        final_frame_center = self.camera.frame.get_center()
-        final_focal_width = self.camera.frame.get_width()
-        self.camera.frame.restore()
-        return final_frame_center, final_focal_width
-
     def construct(self):
-        # Get the final camera settings from a silent run
-        final_center, final_width = self.get_final_camera_setup()
-        title = Tex(r"{title}", font_size=50).to_edge(UP)
+        title = Tex({literal(spec.title)}, font_size=50).to_edge(UP)
         content_elements = [title]
         prev_mobject = title
 """
-    for idx, elem in enumerate(elements):
-        elem_type = elem['type']
-        content_lines = elem['content']
-        content_args = ", ".join([f'r"{line}"' for line in content_lines])
-        class_name = "Tex" if elem_type == "tex" else "MathTex"
-        font_size = 40 if elem_type == "tex" and idx < 2 else (36 if elem_type == "tex" else 40)
+    for idx, elem in enumerate(spec.elements):
+        content_args = ", ".join(literal(line) for line in elem.content)
+        # Use Tex for 'tex' type and MathTex for math content
+        font_size = 40 if elem.type == "tex" and idx < 2 else (36 if elem.type == "tex" else 40)
         code += f"""
-        element{idx} = {class_name}({content_args}, font_size={font_size}).next_to(prev_mobject, DOWN, buff=0.5)
+        element{idx} = {elem.tex_class}({content_args}, font_size={font_size}).next_to(prev_mobject, DOWN, buff=0.5)
         content_elements.append(element{idx})
         prev_mobject = element{idx}
 """
     code += """
+        # Frame the final layout before anything is shown. auto_zoom animates by
+        # default (returning an animation builder); animate=False moves the frame
+        # at once, so no frames are rendered for it.
         content = VGroup(*content_elements)
-        self.camera.frame.move_to(final_center)
-        self.camera.frame.set_width(final_width)
+        self.camera.auto_zoom(content, margin=0.5, animate=False)
         self.play(Write(title))
         self.wait(1)
 """
-    for idx in range(len(elements)):
-        code += f"""
+    for idx in range(len(spec.elements)):
+        clip = narration[idx] if narration else None
+        if clip:
+            code += f"""
+        self.add_sound({literal(clip['path'])})
+        self.play(Write(element{idx}), run_time={max(clip['duration'], 1.0):.2f})
+        self.wait(0.5)
+"""
+        else:
+            code += f"""
         self.play(Write(element{idx}))
         self.wait(1)
 """
@@ -114,6 +124,21 @@ class GeneratedScene(MovingCameraScene):
 """
     return code
 
+def escape_ampersands(elements):
+    """
+    Escapes ampersands in the content and speak strings of parsed elements, in
+    place, to prevent LaTeX errors. Values that aren't strings are left for
+    SceneSpec.from_dict to reject.
+    """
+    for elem in elements:
+        for key in ("content", "speak"):
+            value = elem.get(key, [])
+            if isinstance(value, str):
+                elem[key] = value.replace("&", r"\&")
+            elif isinstance(value, list):
+                elem[key] = [item.replace("&", r"\&") if isinstance(item, str) else item for item in value]
+    return elements
+
 def convert_string_to_dict(input_str):
     """
     Converts a JSON-like string (with unquoted keys) into a Python dictionary.
@@ -125,14 +150,11 @@ def convert_string_to_dict(input_str):
           ...
       ]
     }
+    Markdown fences, r"..." strings and trailing commas are accepted too (see spec_parser.py).
     Also escapes ampersands to prevent LaTeX errors.
     """
-    cleaned_str = input_str.strip().strip('`').replace('json\n', '')
-    parsed_dict = ast.literal_eval(cleaned_str)
-    # Escape ampersands in all content and speak strings.
-    for elem in parsed_dict["elements"]:
-        elem["content"] = [item.replace("&", r"\&") for item in elem["content"]]
-        elem["speak"] = [item.replace("&", r"\&") for item in elem["speak"]]
+    parsed_dict = parse_spec(input_str)
+    escape_ampersands(parsed_dict["elements"])
     return {
         "title": parsed_dict["title"],
         "elements": [
@@ -155,8 +177,7 @@ def extract_slide_content(xml_string):
         </content>
     it returns a list like ["Text from slide 1", "Text from slide 2"].
     """
-    pattern = re.compile(r'<slide\d+>(.*?)</slide\d+>', re.DOTALL)
-    return pattern.findall(xml_string)
+    return SLIDE_PATTERN.findall(xml_string)
 
 def download_audio(youtube_url, output_path="./"):
     """
@@ -193,103 +214,239 @@ genai.configure(api_key=API_KEY)
 from google.generativeai import files
 
 #############################################
-# Section 3: Video File Processing and Transcription
+# Section 3: Video File Processing and Transcription (Visual)
 #############################################
-# def process_video(video_path):
-#     """
-#     Uploads a video file, waits for processing, and returns the file object.
-#     """
-#     print("Uploading file:", video_path)
-    
-#     # Correct file upload method
-#     video_file = genai.upload_file(path=video_path)
-    
-#     print(f"Completed upload: {video_file.uri}")
-#     print("File metadata:", video_file.video_metadata)
-    
-#     # Wait for processing
-#     print("Waiting for processing", end='')
-#     while video_file.state.name == "PROCESSING":
-#         print('.', end='', flush=True)
-#         time.sleep(5)
-#         video_file = genai.get_file(video_file.name)
-    
-#     if video_file.state.name != "ACTIVE":
-#         raise ValueError(f"Video processing failed with state: {video_file.state.name}")
-    
-#     print("\nFile processing completed successfully")
-#     return video_file
-
-def process_video(youtube_url):
-    """
-    Processes a YouTube video URL by passing it directly to Gemini for analysis.
-    Extracts mathematical content written on sheets of paper and formats it as XML.
-    """
-    print("Processing YouTube video:", youtube_url)
-
-    # Define the transcription prompt
-    prompt2vid2text = '''This is a video of a teacher explaining mathematical concepts on sheets of paper. 
-    Your task is to extract and transcribe the exact content written on each sheet.
-    Guidelines:
-    - Use LaTeX for mathematical symbols.
-    - Do not add any extra explanation.
-    - Provide the output in the following XML-like format:
-    <content>
-        <slide1>Extracted content from Slide 1</slide1>
-        <slide2>Extracted content from Slide 2</slide2>
-        <slide3>Extracted content from Slide 3</slide3>
-        ...
-    </content>'''
-
-    # Generate transcription using Gemini model
-    model = genai.GenerativeModel('gemini-1.5-flash')  # Use latest model if available
-
-    response = model.generate_content([
-        {"text": prompt2vid2text},
-        {"file_data": {"file_uri": youtube_url}}
-    ])
-
-    if not response or not response.text:
-        raise ValueError("Failed to process video or no response received.")
-
-    # Print and return response in XML format
-    print("Processing completed successfully.")
-    print(response.text)
-    return response.text  # Returning the transcription in XML format
-
-
-
-# def transcribe_video(video_file):
-#         """
-#         Generates a transcription for the given video file using a Gemini model.
-#         """
-#         prompt2vid2text = '''This is a video of a teacher explaining mathematical concepts on sheets of paper. 
-#     Your task is to extract and transcribe the exact content written on each sheet.
-#     Guidelines:
-#     - Use LaTeX for mathematical symbols.
-#     - Do not add any extra explanation.
-#     - Provide the output in the following XML-like format:
-#     <content>
-#         <slide1>Extracted content from Slide 1</slide1>
-#         <slide2>Extracted content from Slide 2</slide2>
-#         <slide3>Extracted content from Slide 3</slide3>
-#         ...
-#     </content>'''
-#         model = genai.GenerativeModel("gemini-1.5-pro")
-#         response = model.generate_content(contents=[video_file, prompt2vid2text])
-#         print("Transcription response:")
-#         print(response.text)
-#         return response.text
+TRANSCRIBE_MODEL = "gemini-1.5-pro"
+# Remote URLs (e.g. YouTube) keep the model the original script used for them.
+REMOTE_TRANSCRIBE_MODEL = "gemini-1.5-flash"
+
+VIDEO_TRANSCRIPT_PROMPT = '''This is a video of a teacher explaining mathematical concepts on sheets of paper. 
+Your task is to extract and transcribe the exact content written on each sheet.
+Guidelines:
+- Use LaTeX for mathematical symbols.
+- Do not add any extra explanation.
+- Provide the output in the following XML-like format:
+<content>
+    <slide1>Extracted content from Slide 1</slide1>
+    <slide2>Extracted content from Slide 2</slide2>
+    <slide3>Extracted content from Slide 3</slide3>
+    ...
+</content>'''
+
+# "keyframes": send Gemini one image per detected slide; "video": upload the whole video.
+VISUAL_TRANSCRIPT_MODE = os.environ.get("VISUAL_TRANSCRIPT_MODE", "keyframes")
+
+# Videos with more detected slides than this are probably not slide lectures; upload them whole.
+KEYFRAME_MAX_SLIDES = int(os.environ.get("KEYFRAME_MAX_SLIDES", "60"))
+
+KEYFRAME_TRANSCRIPT_PROMPT = '''These images are keyframes from a video of a teacher explaining mathematical concepts on sheets of paper.
+Each image shows one sheet, in the order they appear in the video.
+Your task is to extract and transcribe the exact content written on each sheet.
+Guidelines:
+- Use LaTeX for mathematical symbols.
+- Do not add any extra explanation.
+- Transcribe image N into <slideN>, one slide per image.
+- Provide the output in the following XML-like format:
+<content>
+    <slide1>Extracted content from Slide 1</slide1>
+    <slide2>Extracted content from Slide 2</slide2>
+    <slide3>Extracted content from Slide 3</slide3>
+    ...
+</content>'''
+
+def is_remote_video(video_path):
+    """Returns True when the input is a URL (e.g. YouTube) rather than a local file."""
+    return re.match(r'^https?://', video_path) is not None
+
+def process_video(video_path, content_hash=None, files_api=None, metrics=None):
+    """
+    Uploads a local video file, waits for processing, and returns the file object.
+    A still-available upload of the same bytes (see upload_index.py) is reused.
+    Remote URLs (e.g. YouTube) are passed to Gemini directly as a file_data part.
+    The processing wait backs off exponentially; its stats go to metrics["file_polling"].
+    """
+    if is_remote_video(video_path):
+        print("Using remote video:", video_path)
+        return {"file_data": {"file_uri": video_path}}
+
+    report_progress("uploading")
+    files_api = files_api or GenaiFilesAPI()
+    video_file = get_or_upload(video_path, content_hash or sha256_file(video_path), files_api)
+
+    # Wait for processing
+    print("Waiting for processing")
+    video_file, poll_stats = poll_until(
+        lambda: files_api.get(video_file.name),
+        lambda f: f.state.name != "PROCESSING",
+        BackoffPolicy(),
+        initial=video_file
+    )
+    if metrics is not None:
+        metrics["file_polling"] = poll_stats
+
+    if video_file.state.name != "ACTIVE":
+        raise ValueError(f"Video processing failed with state: {video_file.state.name}")
+
+    print(f"File processing completed after {poll_stats['polls']} polls ({poll_stats['waited']:.1f}s)")
+    return video_file
+
+def stream_text(response, source):
+    """
+    Yields the text of a streamed Gemini response chunk by chunk; raises
+    ValueError when the response has no text at all.
+    """
+    empty = True
+    for chunk in response:
+        # Chunks without parts (e.g. the one carrying only the finish reason) have no .text.
+        text = chunk.text if chunk.parts else ""
+        if text:
+            empty = False
+            yield text
+    if empty:
+        raise ValueError(f"Failed to process {source} or no response received.")
+
+def transcribe_video(video_file, model_name=TRANSCRIBE_MODEL):
+    """
+    Generates a transcription for the given video file (visual text) using a
+    Gemini model, yielding the response text as it is streamed.
+    """
+    report_progress("transcribing", source="video")
+    model = genai.GenerativeModel(model_name)
+    response = model.generate_content(contents=[video_file, VIDEO_TRANSCRIPT_PROMPT], stream=True)
+    yield from stream_text(response, "video")
+
+def detect_job_keyframes(video_path, workdir):
+    """
+    Detects the slides of a local video and saves their keyframes in the job's workdir.
+    Returns None when the whole video should be sent instead (remote video,
+    "video" mode, no slides found, or too many to be a slide lecture).
+    """
+    if VISUAL_TRANSCRIPT_MODE != "keyframes" or is_remote_video(video_path):
+        return None
+    report_progress("analyzing")
+    try:
+        keyframes = detect_keyframes(video_path, os.path.join(workdir, "keyframes"))
+    except Exception as e:
+        print(f"Keyframe detection failed, sending the whole video: {e}")
+        return None
+    print(f"Detected {len(keyframes)} slides at {[round(kf['time'], 1) for kf in keyframes]}s")
+    if not keyframes or len(keyframes) > KEYFRAME_MAX_SLIDES:
+        return None
+    return keyframes
+
+def transcribe_keyframes(keyframes):
+    """
+    Transcribes slide keyframes (see keyframes.py) with the same Gemini model,
+    sending the images inline instead of uploading the video, and yields the
+    response text as it is streamed.
+    """
+    report_progress("transcribing", source="keyframes")
+    contents = [KEYFRAME_TRANSCRIPT_PROMPT]
+    for index, keyframe in enumerate(keyframes, start=1):
+        with open(keyframe["path"], "rb") as f:
+            contents.append(f"Image {index} (shown at {keyframe['time']:.0f}s):")
+            contents.append({"mime_type": "image/jpeg", "data": f.read()})
+    model = genai.GenerativeModel(TRANSCRIBE_MODEL)
+    response = model.generate_content(contents=contents, stream=True)
+    yield from stream_text(response, "keyframes")
+
+def video_hash(video_path):
+    """Content hash of a local video; remote videos are identified by their URL."""
+    if is_remote_video(video_path):
+        return sha256_text(video_path)
+    return sha256_file(video_path)
+
+def stream_video_transcript(video_path, metrics=None, content_hash=None, keyframes=None):
+    """
+    Uploads and transcribes a video, yielding the transcript as it is streamed,
+    unless the same video bytes were already transcribed with the same model and
+    prompt, in which case nothing is uploaded and the cached transcript is yielded at once.
+    content_hash may be passed when the video's sha256 is already known.
+    With keyframes (see detect_job_keyframes), only those images are sent.
+    """
+    content_hash = content_hash or video_hash(video_path)
+    if keyframes:
+        # The keyframe times depend on the detection settings, so they are part of the key.
+        prompt = KEYFRAME_TRANSCRIPT_PROMPT + "\n" + repr([kf["time"] for kf in keyframes])
+        return llm_cache.cached_stream(
+            content_hash, TRANSCRIBE_MODEL, prompt, lambda: transcribe_keyframes(keyframes)
+        )
+    model_name = REMOTE_TRANSCRIBE_MODEL if is_remote_video(video_path) else TRANSCRIBE_MODEL
+    return llm_cache.cached_stream(
+        content_hash, model_name, VIDEO_TRANSCRIPT_PROMPT,
+        lambda: transcribe_video(process_video(video_path, content_hash, metrics=metrics), model_name)
+    )
+
+def stream_job_slides(video_path, metrics, content_hash, keyframes, slides):
+    """
+    Streams the visual transcript and puts each slide into the `slides` channel
+    as soon as its closing tag arrives, so scene generation can start on it
+    while later slides are still being written. Returns the whole transcript.
+    """
+    transcript = SlideStream()
+    try:
+        for chunk in stream_video_transcript(video_path, metrics, content_hash, keyframes):
+            for slide in transcript.feed(chunk):
+                print(f"Slide {len(slides.items) + 1} transcribed")
+                slides.put(slide)
+    except BaseException as e:
+        slides.close(e)
+        raise
+    slides.close()
+    print("Visual transcription response:")
+    print(transcript.text)
+    return transcript.text
 
 #############################################
-# Section 4: Generate Structured JSON for Manim
+# Section 4: Speech (Audio) Transcription using Whisper
 #############################################
-def generate_json_for_manim(slide_text):
+def transcribe_audio_segments(audio_path, model_size=DEFAULT_WHISPER_MODEL):
     """
-    Uses a Gemini model to produce JSON (with 'speak' field) for a Manim scene,
-    based on slide text and a prompt.
+    Transcribes an extracted audio track and returns {"text", "segments"}, each
+    segment being {"start", "end", "text"} in seconds. Recordings longer than
+    WHISPER_PARALLEL_MIN_SECONDS are split at pauses and transcribed on a pool of processes.
     """
-    prompt = """Write this in the given format only dont write anything else json format only
+    print("Transcribing audio...")
+    report_progress("transcribing", source="audio")
+    if WHISPER_PROCESSES > 1 and audio_duration(audio_path) >= WHISPER_PARALLEL_MIN_SECONDS:
+        result = transcribe_parallel(
+            audio_path, model_size,
+            progress=lambda done, total: report_progress("transcribing", source="audio",
+                                                         percent=int(100 * done / total))
+        )
+    else:
+        model = whisper_models.get_model(model_size)
+        result = model.transcribe(load_audio(audio_path))
+        result["segments"] = [
+            {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
+            for seg in result["segments"]
+        ]
+    print("Audio transcription:")
+    print(result["text"])
+    return {"text": result["text"], "segments": result["segments"]}
+
+def extract_job_audio(video_path, workdir):
+    """Extracts the soundtrack once into the job's workdir; None for remote or silent videos."""
+    if is_remote_video(video_path):
+        return None
+    return extract_audio(video_path, os.path.join(workdir, "audio.wav"))
+
+def transcribe_job_audio(video_path, whisper_model, audio_path):
+    """The job's audio transcript as {"text", "segments"}; empty for remote or silent videos."""
+    if audio_path is None:
+        if is_remote_video(video_path):
+            print("Skipping audio transcription for remote video.")
+        else:
+            print("Video has no audio track.")
+        return {"text": "", "segments": []}
+    return transcribe_audio_segments(audio_path, whisper_model)
+
+#############################################
+# Section 5: Generate Structured JSON for Manim
+#############################################
+JSON_MODEL = "gemini-2.0-flash"
+
+MANIM_JSON_PROMPT = """Write this in the given format only dont write anything else json format only
 {
 title : "Introduction to Fourier Transform"
 elements : [
@@ -305,77 +462,531 @@ RETURN your answer in the given format
   elements: list of dictionary(with keys type, content, and speak)
 }
 """
-    combined_input = slide_text + "  " + prompt + " "
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    response = model.generate_content(contents=combined_input)
+
+# "schema": Gemini returns JSON constrained to SceneModel; "prompt": the format is shown in the prompt.
+SCENE_JSON_MODE = os.environ.get("SCENE_JSON_MODE", "schema")
+
+# With a response schema the format needn't be described, only what goes in it.
+MANIM_SCHEMA_PROMPT = """Turn the lecture above into a Manim scene: a title and a list of elements shown one after another.
+Each element has a type ("tex" for text, "math" for a LaTeX equation), its content lines,
+and the sentences to speak while it is on screen."""
+
+def scene_json_to_dict(text):
+    """
+    Validates a response generated with response_schema=SceneModel and returns
+    it as a dict, with ampersands escaped like convert_string_to_dict does.
+    """
+    data = SceneModel.model_validate_json(text).model_dump()
+    escape_ampersands(data["elements"])
+    return data
+
+def generate_json_for_manim(context_text, on_unit=None):
+    """
+    Uses a Gemini model to produce JSON (with 'speak' field) for a Manim scene,
+    based on the combined context (visual slides + audio transcript) and a prompt,
+    and returns it as a SceneSpec.
+    In "schema" mode the response is constrained to SceneModel and validated
+    with it; in "prompt" mode it is parsed with parse_spec.
+    The response is streamed, and on_unit(unit) is called with each tex unit
+    ({"kind", "strings"}, see SceneSpec.tex_units) as soon as it has arrived.
+    Responses are cached by context, so a repeated context skips the call.
+    """
+    model = genai.GenerativeModel(JSON_MODEL)
+    context_hash = sha256_text(context_text)
+    if SCENE_JSON_MODE == "schema":
+        # The schema is part of the cache key, so changing SceneModel invalidates old responses.
+        prompt = MANIM_SCHEMA_PROMPT + "\n" + json.dumps(SceneModel.model_json_schema(), sort_keys=True)
+        config = genai.GenerationConfig(response_mime_type="application/json", response_schema=SceneModel)
+        generate = lambda: stream_text(model.generate_content(
+            contents=context_text + "\n" + MANIM_SCHEMA_PROMPT, generation_config=config, stream=True
+        ), "scene JSON")
+        parse = lambda text: SceneSpec.from_dict(scene_json_to_dict(text))
+    else:
+        prompt = MANIM_JSON_PROMPT
+        generate = lambda: stream_text(model.generate_content(
+            contents=context_text + "\n" + MANIM_JSON_PROMPT, stream=True
+        ), "scene JSON")
+        parse = lambda text: SceneSpec.from_dict(convert_string_to_dict(text))
+    response = ElementStream()
+    title_sent = False
+    for chunk in llm_cache.cached_stream(context_hash, JSON_MODEL, prompt, generate):
+        elements = response.feed(chunk)
+        if on_unit is None:
+            continue
+        if response.title is not None and not title_sent:
+            on_unit({"kind": "Tex", "strings": [response.title]})
+            title_sent = True
+        for elem in escape_ampersands(elements):
+            try:
+                element = Element.from_dict(elem)
+            except ValueError:
+                continue  # reported by the full parse below
+            on_unit({"kind": element.tex_class, "strings": element.content})
+    response_text = response.text
     print("JSON response:")
-    print(response.text)
-    result = convert_string_to_dict(response.text)
-    return result
+    print(response_text)
+    try:
+        return parse(response_text)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        # Don't keep serving a response that can't be parsed.
+        print(f"Could not parse the scene JSON: {e}")
+        llm_cache.cache.discard(context_hash, JSON_MODEL, prompt)
+        raise
 
 #############################################
-# Section 5: Main Execution Flow
+# Section 6: LaTeX Error Checking and Repair
 #############################################
+REVIEW_MODEL = "gemini-1.5-pro"
+
+# Rounds of asking the model to fix the strings that still fail the local LaTeX check.
+LATEX_REPAIR_ATTEMPTS = 2
+
+LATEX_REPAIR_PROMPT = (
+    "Each item below is the list of LaTeX strings of one Manim Tex or MathTex mobject, "
+    "followed by the LaTeX error it causes. Fix the LaTeX in each item. "
+    "Respond with a Python dict mapping each item number to its corrected list of strings, "
+    "and nothing else."
+)
+
+LATEX_REVIEW_PROMPT = (
+    "Each item below is the list of LaTeX strings of one Manim Tex or MathTex mobject. "
+    "Review them for LaTeX errors. Respond with a Python dict mapping the number of each item "
+    "that has errors to its corrected list of strings, or {} if there are none, and nothing else."
+)
+
+def request_latex_patches(units, errors=None):
+    """
+    Asks the review model for corrected strings of the given tex units (see
+    SceneSpec.tex_units). With errors ({index: message}) only those units are
+    sent, with their messages; without, every unit is reviewed.
+    Returns {unit index: [strings]} for the units the model changed.
+    """
+    indexes = sorted(errors) if errors is not None else range(len(units))
+    items = "\n\n".join(
+        f"Item {index}: {units[index]['strings']!r}"
+        + (f"\nError: {errors[index]}" if errors is not None else "")
+        for index in indexes
+    )
+    prompt = LATEX_REPAIR_PROMPT if errors is not None else LATEX_REVIEW_PROMPT
+    model = genai.GenerativeModel(REVIEW_MODEL)
+    response_text = llm_cache.cached(
+        sha256_text(items), REVIEW_MODEL, prompt,
+        lambda: model.generate_content(contents=[items, prompt]).text
+    )
+    try:
+        patches = parse_spec(response_text)
+    except ValueError:
+        patches = None
+    if not isinstance(patches, dict):
+        llm_cache.cache.discard(sha256_text(items), REVIEW_MODEL, prompt)
+        print("Could not parse the LaTeX review response:")
+        print(response_text)
+        return {}
+    return {
+        int(index): strings for index, strings in patches.items()
+        if str(index).isdigit() and int(index) in indexes
+        and isinstance(strings, list) and strings and all(isinstance(text, str) for text in strings)
+    }
+
+def fix_latex_errors(spec, known=None):
+    """
+    Compiles all Tex/MathTex strings of the scene locally in one batched LaTeX
+    run and has the model patch only the ones that fail, so a scene whose
+    LaTeX is fine needs no LLM call. Without a local LaTeX install the model
+    reviews the strings instead. Patches are applied to the spec in place.
+    known holds results of units already compiled while the scene streamed in
+    (see latex_check.BackgroundCheck); only the first check uses them.
+    """
+    for attempt in range(LATEX_REPAIR_ATTEMPTS + 1):
+        units = spec.tex_units()
+        errors = latex_check.find_errors(units, known if attempt == 0 else None)
+        if errors is None:
+            print("Local LaTeX check unavailable; asking the model to review the strings.")
+            patches = request_latex_patches(units)
+            for index, strings in patches.items():
+                spec.patch(index, strings)
+            print(f"The model corrected {len(patches)} of {len(units)} LaTeX units.")
+            return spec
+        if not errors:
+            print("No LaTeX errors detected in the generated scene.")
+            return spec
+        for index, error in errors.items():
+            print(f"LaTeX error in {units[index]['kind']}{tuple(units[index]['strings'])}: {error}")
+        if attempt == LATEX_REPAIR_ATTEMPTS:
+            break
+        for index, strings in request_latex_patches(units, errors).items():
+            spec.patch(index, strings)
+    print("Some LaTeX errors could not be repaired; rendering anyway.")
+    return spec
+
+def fix_unicode_characters(latex_str):
+    """
+    Replaces problematic Unicode characters with their LaTeX command equivalents.
+    """
+    replacements = {
+        "≥": r"\geq",
+        "≤": r"\leq",
+        "→": r"\to",
+        "∞": r"\infty",
+        "ε": r"\epsilon",
+    }
+    for char, replacement in replacements.items():
+        latex_str = latex_str.replace(char, replacement)
+    return latex_str
+
+#############################################
+# Section 7: Scene Generation and Rendering
+#############################################
+# Maximum number of slides generated and rendered at once in per-slide mode.
+SLIDE_CONCURRENCY = int(os.environ.get("SLIDE_CONCURRENCY", "4"))
+
+def narrate_elements(elements):
+    """
+    Synthesizes each element's `speak` sentences (see tts_cache.py) and returns
+    one clip per element, or None for elements with nothing to say.
+    """
+    report_progress("narrating")
+    texts = [" ".join(elem.speak).replace(r"\&", "&").strip() for elem in elements]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(lambda text: tts_cache.synthesize(text) if text else None, texts))
+
+def build_scene_code(context_text, voiceover=False):
+    """
+    Turns one slide's context into Manim scene code: JSON generation into a
+    SceneSpec, Unicode fixes and LaTeX check/repair on the spec, then code
+    generation from the final spec.
+    The LaTeX of each element is compiled in the background as soon as it has
+    streamed in, so by the end of the response most of the check is done.
+    With voiceover, the elements' `speak` fields are narrated in the scene.
+    """
+    report_progress("json")
+    precheck = latex_check.BackgroundCheck()
+    try:
+        spec = generate_json_for_manim(
+            context_text,
+            on_unit=lambda unit: precheck.submit(
+                {"kind": unit["kind"], "strings": [fix_unicode_characters(text) for text in unit["strings"]]}
+            )
+        )
+    finally:
+        known_latex = precheck.results()
+    for elem in spec.elements:
+        print("Content:", elem.content)
+
+    # Fix known Unicode issues first, so the LaTeX check doesn't flag them
+    spec.map_strings(fix_unicode_characters)
+
+    # Compile the LaTeX strings locally; the review model only patches the ones that fail
+    report_progress("latex-check")
+    fix_latex_errors(spec, known_latex)
+
+    # Generate Manim scene code from the checked spec
+    narration = narrate_elements(spec.elements) if voiceover else None
+    return generate_manim_code(spec, narration)
+
+# Scratch space for running jobs; each job gets media/jobs/<job_id>/.
+JOBS_DIR = os.path.join("media", "jobs")
+
+def job_workdir(job_id):
+    """Creates and returns the scratch directory of one job."""
+    workdir = os.path.abspath(os.path.join(JOBS_DIR, job_id))
+    os.makedirs(workdir, exist_ok=True)
+    return workdir
+
+def scene_module_path(workdir, job_id, suffix=""):
+    """A scene file with a module name unique to the job (and slide)."""
+    module_name = "scene_" + re.sub(r'\W', '_', job_id) + suffix
+    return os.path.join(workdir, module_name + ".py")
+
+def render_scene(scene_path, media_dir, scene_name="GeneratedScene"):
+    """
+    Renders a generated scene file in the current process and returns the
+    path of the resulting video. Rendering in-process (instead of running
+    `python3 -m manim`) lets a long-lived worker reuse the already imported manim.
+    Progress is reported as the share of the scene's self.play calls rendered so far.
+    """
+    module_name = os.path.splitext(os.path.basename(scene_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, scene_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with open(scene_path) as f:
+        total_plays = max(f.read().count("self.play("), 1)
+    with tempconfig({"quality": "low_quality", "input_file": scene_path, "media_dir": media_dir}):
+        scene = getattr(module, scene_name)()
+        play = scene.play
+        plays_done = 0
+
+        def play_and_report(*args, **kwargs):
+            nonlocal plays_done
+            play(*args, **kwargs)
+            plays_done += 1
+            report_progress("rendering", percent=min(100, round(100 * plays_done / total_plays)))
+
+        scene.play = play_and_report
+        report_progress("rendering", percent=0)
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+def render_scene_subprocess(scene_path, media_dir, scene_name="GeneratedScene"):
+    """
+    Renders a scene in a separate manim process and returns the video path.
+    manim's global config isn't thread-safe, so concurrent renders each get a process.
+    The process runs manim through tex_cache.py so it shares the LaTeX/SVG cache.
+    """
+    subprocess.run(
+        [sys.executable, tex_cache.__file__, "-ql", "--media_dir", media_dir, scene_path, scene_name],
+        check=True
+    )
+    module_name = os.path.splitext(os.path.basename(scene_path))[0]
+    return os.path.join(media_dir, "videos", module_name, "480p15", f"{scene_name}.mp4")
+
+# Narrated clips are re-encoded to one audio format when joined (see concat_videos).
+CONCAT_SAMPLE_RATE = 44100
+
+def clip_streams(path):
+    """(has an audio track, duration in seconds) of a rendered clip."""
+    import av
+    with av.open(path) as container:
+        return len(container.streams.audio) > 0, container.duration / av.time_base
+
+def concat_videos(video_paths, output_path):
+    """
+    Concatenates clips rendered with identical settings into one video.
+    Without sound they are joined without re-encoding. manim only adds an audio
+    track to clips that called add_sound, and the concat demuxer takes its stream
+    layout from the first clip, so when any clip is narrated the clips are joined
+    with the concat filter instead: clips without sound get a silent track of
+    their length, and every track is resampled to one format.
+    """
+    clips = [(path, *clip_streams(path)) for path in video_paths]
+    if any(audio for _, audio, _ in clips):
+        return concat_narrated_videos(clips, output_path)
+    list_path = output_path + ".txt"
+    with open(list_path, "w") as f:
+        for path in video_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", output_path],
+            check=True
+        )
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def concat_narrated_videos(clips, output_path):
+    """Joins (path, has audio, seconds) clips with the concat filter, re-encoding video and audio."""
+    command = ["ffmpeg", "-y", "-loglevel", "error"]
+    filters, segments = [], []
+    for i, (path, audio, seconds) in enumerate(clips):
+        command += ["-i", path]
+        source = f"[{i}:a]" if audio else f"anullsrc=r={CONCAT_SAMPLE_RATE}:cl=stereo,"
+        # Pad or cut each track to its clip's length, so the segments stay in sync.
+        filters.append(f"{source}aresample={CONCAT_SAMPLE_RATE},aformat=channel_layouts=stereo,"
+                       f"apad,atrim=duration={seconds:.3f}[a{i}]")
+        segments.append(f"[{i}:v][a{i}]")
+    filters.append("".join(segments) + f"concat=n={len(clips)}:v=1:a=1[v][a]")
+    command += ["-filter_complex", ";".join(filters), "-map", "[v]", "-map", "[a]",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", output_path]
+    subprocess.run(command, check=True)
+    return output_path
+
+def promote_output(video_path, output_path):
+    """
+    Moves a finished video to output_path atomically, so readers of output_path
+    never see a partial file: it is staged next to the target, then renamed.
+    """
+    with atomic_path(output_path, suffix=".part") as staging_path:
+        shutil.move(video_path, staging_path)
+    return output_path
+
+def render_slides(slides, slide_speech, workdir, job_id, voiceover=False, expected=0):
+    """
+    Generates and renders one scene per slide, SLIDE_CONCURRENCY at a time,
+    then concatenates the clips in slide order and returns the joined video.
+    slides may be a Channel that is still being filled; each slide starts as
+    soon as it arrives. slide_speech(idx, slide_count) is the audio transcript
+    for slide idx (see slide_audio_transcripts); slides whose transcript changes
+    once the final count is known are generated again. expected is the number
+    of slides anticipated, for progress until all have arrived.
+    """
+    received = []
+    rendered = 0
+    rendered_lock = threading.Lock()
+
+    def render_slide(idx, slide, speech, suffix=""):
+        nonlocal rendered
+        context = f"Visual Transcript:\n{slide}\n\nAudio Transcript:\n{speech}"
+        scene_path = scene_module_path(workdir, job_id, f"_slide{idx}{suffix}")
+        with open(scene_path, "w") as f:
+            f.write(build_scene_code(context, voiceover))
+        print(f"Rendering slide {idx + 1}")
+        clip = render_scene_subprocess(scene_path, workdir)
+        with rendered_lock:
+            rendered += 1
+            report_progress("rendering", percent=min(100, round(100 * rendered / max(len(received), expected))))
+        return clip
+
+    with ThreadPoolExecutor(max_workers=SLIDE_CONCURRENCY) as executor:
+        futures = []
+        for idx, slide in enumerate(slides):
+            with rendered_lock:
+                received.append(slide)
+            futures.append(executor.submit(render_slide, idx, slide, slide_speech(idx)))
+        for idx, slide in enumerate(received):
+            speech = slide_speech(idx, len(received))
+            if speech != slide_speech(idx):
+                # The slides don't pair up with the keyframes after all.
+                print(f"Slide {idx + 1} was started with keyframe speech; regenerating it with the whole transcript")
+                futures[idx].cancel()
+                futures[idx] = executor.submit(render_slide, idx, slide, speech, "_whole")
+        clips = [future.result() for future in futures]
+    if not clips:
+        raise ValueError("No slides extracted from visuals.")
+    return concat_videos(clips, os.path.join(workdir, "slides.mp4"))
+
+#############################################
+# Section 8: Main Execution Flow
+#############################################
+def slide_audio_transcripts(keyframes, audio):
+    """
+    Returns speech(idx, slide_count=None), the audio transcript for slide idx.
+    When the slides come from detected keyframes and there is one slide per
+    keyframe, slide idx gets only the speech from while keyframe idx was shown;
+    otherwise (the model merged or split sheets) every slide gets the whole transcript.
+    Slides stream in one by one, so until slide_count is known the pairing is
+    assumed for slides within the keyframes; callers check it again with the final count.
+    """
+    aligned = align_segments(audio["segments"], keyframes) if keyframes and audio["segments"] else []
+
+    def speech(idx, slide_count=None):
+        if idx < len(aligned) and slide_count in (None, len(aligned)):
+            return aligned[idx]
+        return audio["text"]
+    return speech
+
+def generate_job_scenes(slides, keyframes, audio, workdir, job_id, per_slide, voiceover):
+    """
+    Starts on the slides while they are still streaming in (slides is a Channel).
+    With per_slide, every slide is generated and rendered (see render_slides)
+    and the joined video is returned. Otherwise the scene code for one slide
+    (the second, as the original script picked, or the only one) is built as
+    soon as that slide has arrived, and returned.
+    """
+    slide_speech = slide_audio_transcripts(keyframes, audio)
+    if per_slide:
+        return render_slides(slides, slide_speech, workdir, job_id, voiceover, expected=len(keyframes or []))
+
+    # Combine one selected slide (for simplicity) with its part of the audio transcript as context.
+    first_slides = list(itertools.islice(slides, 2))
+    if not first_slides:
+        raise ValueError("No slides extracted from visuals.")
+    idx = len(first_slides) - 1
+    combined_context = f"Visual Transcript:\n{first_slides[idx]}\n\nAudio Transcript:\n{slide_speech(idx)}"
+    manim_code = build_scene_code(combined_context, voiceover)
+    for _ in slides:
+        pass  # wait for the rest of the transcript, to check the slide count
+    speech = slide_speech(idx, len(slides.items))
+    if speech != slide_speech(idx):
+        print("The slides don't pair up with the keyframes; regenerating the scene with the whole transcript")
+        combined_context = f"Visual Transcript:\n{first_slides[idx]}\n\nAudio Transcript:\n{speech}"
+        manim_code = build_scene_code(combined_context, voiceover)
+    return manim_code
+
+def run_pipeline(video_path, output_path=None, whisper_model=DEFAULT_WHISPER_MODEL, per_slide=False,
+                 metrics=None, job_id=None, progress=None, content_hash=None, voiceover=False):
+    """
+    Runs the full video -> slides -> JSON -> Manim pipeline for one video and
+    returns output_path (default media/videos/<job_id>.mp4), where the video is
+    moved atomically once it is complete.
+    Each job works in its own scratch directory with its own scene module and
+    manim media_dir, so concurrent jobs never share files.
+    whisper_model selects the Whisper size used for the audio transcript.
+    With per_slide, every slide gets its own scene and the clips are joined into one video.
+    With voiceover, the generated `speak` sentences are narrated over their elements.
+    If a metrics dict is given, stage durations and file polling stats are recorded in it.
+    progress(stage, **info) is called on every stage transition of the job.
+    content_hash is the video's sha256 when the caller already knows it.
+    """
+    global _progress_listener
+    _progress_listener = progress
+    try:
+        return _run_pipeline(video_path, output_path, whisper_model, per_slide, metrics, job_id, content_hash,
+                             voiceover)
+    finally:
+        _progress_listener = None
+
+def _run_pipeline(video_path, output_path, whisper_model, per_slide, metrics, job_id, content_hash, voiceover):
+    job_id = job_id or uuid.uuid4().hex
+    output_path = output_path or os.path.join("media", "videos", f"{job_id}.mp4")
+    metrics = {} if metrics is None else metrics
+    tex_counts_before = tex_cache.stats()
+    workdir = job_workdir(job_id)
+    try:
+        # The remote branch (upload + visual transcription) and the local Whisper
+        # branch are independent, so run them concurrently. The visual transcript
+        # is streamed, and scene generation starts on each slide once it and the
+        # audio transcript are in, while the model is still writing later slides.
+        stages = StageScheduler()
+        slides = Channel()
+        stages.add("keyframes", lambda: detect_job_keyframes(video_path, workdir))
+        stages.add("transcribe_video",
+                   lambda keyframes: stream_job_slides(video_path, metrics, content_hash, keyframes, slides),
+                   after=["keyframes"])
+        stages.add("extract_audio", lambda: extract_job_audio(video_path, workdir))
+        stages.add("transcribe_audio", lambda audio_path: transcribe_job_audio(video_path, whisper_model, audio_path),
+                   after=["extract_audio"])
+        stages.add("scenes",
+                   lambda keyframes, audio: generate_job_scenes(slides, keyframes, audio, workdir, job_id,
+                                                                per_slide, voiceover),
+                   after=["keyframes", "transcribe_audio"])
+        metrics["stages"] = stages.timings
+        results = stages.run()
+        metrics["keyframes"] = len(results["keyframes"] or [])
+        metrics["audio_segments"] = len(results["transcribe_audio"]["segments"])
+        metrics["slides"] = len(slides.items)
+        print("Extracted slides:", slides.items)
+
+        if per_slide:
+            return promote_output(results["scenes"], output_path)
+
+        manim_code = results["scenes"]
+
+        scene_path = scene_module_path(workdir, job_id)
+        with open(scene_path, "w") as f:
+            f.write(manim_code)
+        print(f"Manim scene code saved to {scene_path}")
+
+        generated_video_path = render_scene(scene_path, workdir)
+        tex_counts = tex_cache.stats()
+        metrics["tex_cache"] = {k: tex_counts[k] - tex_counts_before[k] for k in tex_counts}
+        return promote_output(generated_video_path, output_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
 def main():
-    # Expect the local video file path as a command-line argument
+    # Expect the video file path (or URL) as a command-line argument
     if len(sys.argv) < 2:
-        print("Usage: python3 script-code.py <video_file>")
+        print("Usage: python3 script-code.py <video_file> [--per-slide] [--voiceover]")
         sys.exit(1)
-    video_url = sys.argv[1]
-    
-    # Process video and get transcription
-    transcription_text = process_video(video_url)
-    # transcription_text = transcribe_video(video_file)
-    
-    # Extract slide content from transcription
-    slides = extract_slide_content(transcription_text)
-    print("Extracted slides:", slides)
-    if len(slides) == 0:
-        print("No slides extracted. Exiting.")
-        sys.exit(1)
-    
-    # Use the second slide (if available) for generating JSON, otherwise the first slide.
-    slide_for_json = slides[1] if len(slides) > 1 else slides[0]
-    structured_result = generate_json_for_manim(slide_for_json)
-    
-    # Extract title and elements from the structured JSON
-    title = structured_result["title"]
-    elements = structured_result["elements"]
-    for elem in elements:
-        print("Content:", elem['content'])
-        # Optionally print the speak field:
-        # print("Speak:", elem['speak'])
-    
-    # (Optional) Generate Manim scene code and save to a file
-    manim_code = generate_manim_code(title, elements)
-    with open("generated_scene.py", "w") as f:
-        f.write(manim_code)
-    print("Manim scene code saved to generated_scene.py")
-    
-    # (Optional) Run the generated scene using subprocess (if desired)
-    # Uncomment the following lines to render the scene:
-    import subprocess
-    import shutil
-    subprocess.run(["python3", "-m", "manim", "-ql", "generated_scene.py", "GeneratedScene"], check=True)
-    # After rendering the Manim scene
-    manim_output_dir = os.path.join("media", "videos", "generated_scene", "480p15")
-    generated_video_path = os.path.join(manim_output_dir, "GeneratedScene.mp4")
-    destination_path = os.path.join("media", "videos", "GeneratedScene.mp4")
+    video_path = sys.argv[1]
+    per_slide = "--per-slide" in sys.argv[2:]
+    voiceover = "--voiceover" in sys.argv[2:]
 
-    # Ensure destination directory exists
-    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    # Copy the generated video to the location the Flask app expects
+    destination_path = os.path.join("media", "videos", "GeneratedScene.mp4")
+    try:
+        run_pipeline(video_path, destination_path, per_slide=per_slide, voiceover=voiceover)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    # Copy the generated video to the expected location
-    if os.path.exists(generated_video_path):
-        shutil.copy(generated_video_path, destination_path)
-    else:
-        print(f"Error: Generated video not found at {generated_video_path}")
-    
 if __name__ == '__main__':
     main()
 
 #############################################
-# Section 6: Download Audio from YouTube (Optional)
+# Section 9: Download Audio from YouTube (Optional)
 #############################################
 def download_youtube_audio():
     youtube_link = "https://www.youtube.com/watch?v=nYVig7BfuEA"
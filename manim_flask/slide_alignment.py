@@ -0,0 +1,51 @@
+"""
+slide_alignment.py
+
+Maps the audio transcript onto slides using Whisper segment times and slide-change times.
+
+Each Whisper segment goes to the slide that was on screen for most of it (see
+keyframes.py for the shown intervals), or to the nearest slide when it falls in
+a transition. Every slide's prompt then carries only what was said while it
+was shown instead of the whole lecture's transcript.
+
+Usage:
+    speech = align_segments(transcript["segments"], keyframes)
+    speech[0]   # what was said while slide 1 was shown
+"""
+
+from bisect import bisect_left, bisect_right
+
+def _overlap(start, end, interval):
+    return max(0.0, min(end, interval[2]) - max(start, interval[1]))
+
+def _distance(start, end, interval):
+    if end <= interval[1]:
+        return interval[1] - end
+    return max(0.0, start - interval[2])
+
+def align_segments(segments, keyframes):
+    """
+    Assigns each {"start", "end", "text"} segment to one of the keyframes'
+    slides and returns one speech text per slide, in keyframe order.
+    """
+    speech = [[] for _ in keyframes]
+    intervals = sorted(
+        ((index, start, end) for index, keyframe in enumerate(keyframes)
+         for start, end in keyframe['intervals']),
+        key=lambda interval: interval[1]
+    )
+    if not intervals:
+        return [''] * len(keyframes)
+    starts = [interval[1] for interval in intervals]
+
+    for segment in segments:
+        start, end = segment['start'], segment['end']
+        # Intervals are disjoint, so only those from the one containing `start`
+        # up to the first one after `end` can overlap or be nearest.
+        first = max(bisect_right(starts, start) - 1, 0)
+        last = min(bisect_left(starts, end) + 1, len(intervals))
+        candidates = intervals[first:last]
+        best = max(candidates, key=lambda interval: (_overlap(start, end, interval),
+                                                     -_distance(start, end, interval)))
+        speech[best[0]].append(segment['text'])
+    return [' '.join(text for text in texts if text) for texts in speech]
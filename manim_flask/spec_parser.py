@@ -0,0 +1,181 @@
+"""
+spec_parser.py
+
+A single-pass parser for the JSON-like scene spec the model writes.
+
+The prompt asks for `title : "..."` with unquoted keys and shows r"..." strings,
+and responses often come wrapped in markdown fences or with trailing commas;
+ast.literal_eval and json.loads reject all of those. This parser accepts them in
+one left-to-right scan:
+
+    - code fences and other text before the object
+    - unquoted (identifier) keys, integer keys and quoted keys
+    - "..." and '...' strings, with an optional r/R prefix; adjacent strings are joined
+    - trailing commas in objects and lists, and missing ones at line breaks
+    - numbers, true/false/null and True/False/None
+
+Outside raw strings, only \\\\, \\", \\', \\/ and \\uXXXX are unescaped, plus \\n and
+\\t when no letter follows; any other backslash is kept, so LaTeX such as
+"\\frac" or "\\theta" survives without a raw prefix. Errors raise
+SpecParseError with the line and column of the offending token.
+
+Tokens (including whole strings) are matched by one compiled regex, so the
+Python-level work is one step per token rather than per character.
+
+Usage:
+    data = parse_spec(response_text)   # {"title": ..., "elements": [...]}
+"""
+
+import re
+
+class SpecParseError(ValueError):
+    def __init__(self, message, text, pos):
+        self.line = text.count('\n', 0, pos) + 1
+        self.column = pos - (text.rfind('\n', 0, pos) + 1) + 1
+        super().__init__(f"line {self.line}, column {self.column}: {message}")
+
+# Groups, also the values of match.lastindex: 1 punctuation, 3 "string" (2 its
+# r prefix), 5 'string' (4 its r prefix), 6 number, 7 word.
+TOKEN = re.compile(r'''\s*(?:
+    ([{}\[\]:,])
+  | ([rR]?)"([^"\\]*(?:\\.[^"\\]*)*)"
+  | ([rR]?)'([^'\\]*(?:\\.[^'\\]*)*)'
+  | (-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | ([A-Za-z_]\w*)
+)''', re.VERBOSE | re.DOTALL)
+
+PUNCT, DQ_STRING, SQ_STRING, NUMBER, WORD = 1, 3, 5, 6, 7
+
+WHITESPACE = re.compile(r'\s*')
+FENCE = re.compile(r'\s*```[A-Za-z]*\s*')
+ESCAPE = re.compile(r'''\\(u[0-9a-fA-F]{4}|[nt](?![A-Za-z])|[\\"'/])''')
+
+CONSTANTS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+LETTER_ESCAPES = {'n': '\n', 't': '\t'}
+
+def _unescape(match):
+    escaped = match.group(1)
+    if len(escaped) == 5:
+        return chr(int(escaped[1:], 16))
+    return LETTER_ESCAPES.get(escaped, escaped)
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+
+    def error(self, message, pos):
+        return SpecParseError(message, self.text, pos)
+
+    def describe(self, pos):
+        pos = WHITESPACE.match(self.text, pos).end()
+        return repr(self.text[pos]) if pos < len(self.text) else 'end of input'
+
+    def token(self, pos, expected):
+        match = TOKEN.match(self.text, pos)
+        if match is None:
+            raise self.error(f"expected {expected}, got {self.describe(pos)}", WHITESPACE.match(self.text, pos).end())
+        return match
+
+    def string(self, match):
+        """The text of a string token, joined with any adjacent string tokens; returns (text, end)."""
+        parts = []
+        while True:
+            index = match.lastindex
+            body = match.group(index)
+            if '\\' in body and not match.group(index - 1):
+                body = ESCAPE.sub(_unescape, body)
+            parts.append(body)
+            end = match.end()
+            # Fast path: a string is almost always followed by one of these.
+            if self.text[end:end + 1] in (',', ']', '}', ':'):
+                break
+            following = TOKEN.match(self.text, end)
+            if following is None or following.lastindex not in (DQ_STRING, SQ_STRING):
+                break
+            match = following
+        return ''.join(parts), end
+
+    def value(self, pos):
+        """Parses the value at pos; returns (value, end)."""
+        match = self.token(pos, 'a value')
+        kind = match.lastindex
+        if kind == PUNCT:
+            char = match.group(PUNCT)
+            if char == '{':
+                return self.obj(match.end())
+            if char == '[':
+                return self.array(match.end())
+        elif kind == DQ_STRING or kind == SQ_STRING:
+            return self.string(match)
+        elif kind == NUMBER:
+            number = match.group(NUMBER)
+            return (float(number) if any(c in number for c in '.eE') else int(number)), match.end()
+        elif match.group(WORD) in CONSTANTS:
+            return CONSTANTS[match.group(WORD)], match.end()
+        raise self.error(f"expected a value, got {self.describe(pos)}", match.start(kind))
+
+    def separator(self, end, closing, what):
+        """After an item: consumes ',' or `closing` (returns (pos, closed)); a line break also separates items."""
+        match = self.token(end, f"',' or '{closing}' after {what}")
+        char = match.group(PUNCT)
+        if char == ',':
+            return match.end(), False
+        if char == closing:
+            return match.end(), True
+        if '\n' in self.text[end:match.start(match.lastindex)]:
+            return end, False
+        raise self.error(f"expected ',' or '{closing}' after {what}, got {self.describe(end)}",
+                         match.start(match.lastindex))
+
+    def obj(self, pos):
+        result = {}
+        while True:
+            match = self.token(pos, "a key or '}'")
+            kind = match.lastindex
+            if kind == PUNCT and match.group(PUNCT) == '}':
+                return result, match.end()
+            if kind == DQ_STRING or kind == SQ_STRING:
+                key, pos = self.string(match)
+            elif kind == WORD:
+                key, pos = match.group(WORD), match.end()
+            elif kind == NUMBER and match.group(NUMBER).isdigit():
+                key, pos = int(match.group(NUMBER)), match.end()
+            else:
+                raise self.error(f"expected a key or '}}', got {self.describe(pos)}", match.start(kind))
+            colon = self.token(pos, f"':' after key {key!r}")
+            if colon.group(PUNCT) != ':':
+                raise self.error(f"expected ':' after key {key!r}, got {self.describe(pos)}",
+                                 colon.start(colon.lastindex))
+            result[key], end = self.value(colon.end())
+            pos, closed = self.separator(end, '}', f"the value of {key!r}")
+            if closed:
+                return result, pos
+
+    def array(self, pos):
+        result = []
+        while True:
+            match = self.token(pos, "a value or ']'")
+            if match.group(PUNCT) == ']':
+                return result, match.end()
+            item, end = self.value(pos)
+            result.append(item)
+            pos, closed = self.separator(end, ']', f"list item {len(result)}")
+            if closed:
+                return result, pos
+
+def parse_spec(text):
+    """
+    Parses a scene spec response into Python objects; raises SpecParseError.
+    Text before the first '{' (e.g. a ```json fence) is skipped, and after the
+    object only whitespace and a closing fence may follow.
+    """
+    start = text.find('{')
+    if start < 0:
+        raise SpecParseError("no {...} object found", text, 0)
+    parser = _Parser(text)
+    result, end = parser.obj(start + 1)
+    fence = FENCE.match(text, end)
+    end = fence.end() if fence else WHITESPACE.match(text, end).end()
+    if end != len(text):
+        raise parser.error(f"unexpected {parser.describe(end)} after the closing '}}'", end)
+    return result
@@ -0,0 +1,171 @@
+"""
+tex_cache.py
+
+A LaTeX -> SVG cache shared by every render worker on the host.
+
+manim keeps compiled formulas in a per-media_dir `Tex` folder, so concurrent
+jobs and fresh containers recompile the same formulas. install() routes manim's
+tex_to_svg_file through one shared directory instead: SVGs are compiled in a
+private scratch folder and moved in with an atomic rename, the least recently
+used SVGs are evicted when the cache grows past its size limit, and hits and
+misses are counted per process.
+
+Usage:
+    import tex_cache
+    tex_cache.install()        # in a process that renders scenes in-process
+    python3 tex_cache.py -ql scene.py GeneratedScene   # manim CLI with the cache
+    python3 tex_cache.py --check                       # compile an uncached formula end to end
+"""
+
+import os
+import sys
+import time
+import fcntl
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+from atomic_files import atomic_path
+
+TEX_CACHE_DIR = os.path.abspath(os.environ.get('TEX_CACHE_DIR', os.path.join('media', 'tex_cache')))
+TEX_CACHE_MAX_MB = int(os.environ.get('TEX_CACHE_MAX_MB', '512'))
+
+# Entries used this recently are never evicted: another worker may be about to read them.
+MIN_EVICTION_AGE = 60
+
+counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def compile_in(directory, tex_file, tex_compiler, output_format):
+    """
+    manim's compile_tex, with the compiler output going to `directory`.
+    compile_tex always writes to config's tex_dir but returns a path next to
+    tex_file, which in the scratch folder would not exist.
+    """
+    from manim.utils.tex_file_writing import make_tex_compilation_command, print_all_tex_errors
+
+    result = tex_file.with_suffix(output_format)
+    command = make_tex_compilation_command(tex_compiler, output_format, tex_file, Path(directory))
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+    if completed.returncode != 0 or not result.exists():
+        log_file = tex_file.with_suffix('.log')
+        print_all_tex_errors(log_file, tex_compiler, tex_file)
+        raise ValueError(f"{tex_compiler} error converting to {output_format[1:]}. "
+                         f"See log output above or the log file: {log_file}")
+    return result
+
+class SharedTexCache:
+    """SVG files named by manim's tex_hash of the full LaTeX document."""
+
+    def __init__(self, directory=TEX_CACHE_DIR, max_bytes=TEX_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def tex_to_svg_file(self, expression, environment=None, tex_template=None):
+        """Drop-in replacement for manim.utils.tex_file_writing.tex_to_svg_file."""
+        from manim import config
+        from manim.utils.tex_file_writing import tex_hash, convert_to_svg
+
+        if tex_template is None:
+            tex_template = config["tex_template"]
+        if environment is not None:
+            output = tex_template.get_texcode_for_expression_in_env(expression, environment)
+        else:
+            output = tex_template.get_texcode_for_expression(expression)
+
+        svg_file = self.directory / (tex_hash(output) + '.svg')
+        if svg_file.exists():
+            counters['hits'] += 1
+            os.utime(svg_file)
+            return svg_file
+
+        counters['misses'] += 1
+        scratch = Path(tempfile.mkdtemp(prefix='.compile-', dir=self.directory))
+        try:
+            tex_file = scratch / (svg_file.stem + '.tex')
+            tex_file.write_text(output, encoding='utf-8')
+            dvi_file = compile_in(scratch, tex_file, tex_template.tex_compiler, tex_template.output_format)
+            compiled_svg = convert_to_svg(dvi_file, tex_template.output_format)
+            os.replace(compiled_svg, svg_file)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        self.evict()
+        return svg_file
+
+    def seed(self, source_dir):
+        """Copies SVGs from a per-project manim Tex folder into the shared cache."""
+        if not os.path.isdir(source_dir):
+            return
+        for name in os.listdir(source_dir):
+            target = self.directory / name
+            if name.endswith('.svg') and not target.exists():
+                with atomic_path(target) as tmp_path:
+                    shutil.copyfile(os.path.join(source_dir, name), tmp_path)
+
+    def size(self):
+        return sum(path.stat().st_size for path in self.directory.glob('*.svg'))
+
+    def evict(self):
+        """Removes least recently used SVGs until the cache is within max_bytes."""
+        with open(self.directory / '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = []
+            for path in self.directory.glob('*.svg'):
+                try:
+                    stat = path.stat()
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                except FileNotFoundError:
+                    pass
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - MIN_EVICTION_AGE
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes or mtime > cutoff:
+                    break
+                path.unlink(missing_ok=True)
+                counters['evictions'] += 1
+                total -= size
+
+_cache = None
+
+def install(directory=TEX_CACHE_DIR, seed_from=os.path.join('media', 'Tex')):
+    """Routes manim's Tex/MathTex compilation through the shared cache."""
+    global _cache
+    if _cache is not None:
+        return _cache
+    import manim.utils.tex_file_writing as tex_file_writing
+    import manim.mobject.text.tex_mobject as tex_mobject
+
+    _cache = SharedTexCache(directory)
+    _cache.seed(seed_from)
+    # tex_mobject imported the function by name, so patch both references.
+    tex_file_writing.tex_to_svg_file = _cache.tex_to_svg_file
+    tex_mobject.tex_to_svg_file = _cache.tex_to_svg_file
+    return _cache
+
+def stats():
+    return dict(counters)
+
+def self_check():
+    """
+    Compiles a formula that can't be cached yet (it contains the current time)
+    into a throwaway cache and checks that an SVG comes out; raises on failure.
+    """
+    directory = tempfile.mkdtemp(prefix='tex-cache-check-')
+    try:
+        svg_file = SharedTexCache(directory).tex_to_svg_file(f'x^2 + {time.time_ns()}', environment='align*')
+        if not svg_file.exists() or svg_file.stat().st_size == 0:
+            raise RuntimeError(f"tex_cache compiled no SVG for an uncached formula ({svg_file})")
+        return svg_file.name
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--check']:
+        print(f"tex_cache OK: compiled {self_check()}")
+        sys.exit(0)
+    # Run the manim CLI with the shared cache installed, e.g. for subprocess renders.
+    install()
+    from manim.__main__ import main
+    sys.argv[0] = 'manim'
+    main()
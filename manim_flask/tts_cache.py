@@ -0,0 +1,78 @@
+"""
+tts_cache.py
+
+Narration clips for the `speak` field, synthesized once and shared by every job.
+
+Each clip is stored under the sha256 of the engine, voice and sentence, so a
+sentence that was already spoken (in this lecture or any earlier one) is never
+synthesized again. Clips are written to a scratch file and moved in with an
+atomic rename, so concurrent workers never read half-written audio.
+
+Engines:
+    gtts     Google Translate TTS via gTTS (MP3, needs network access)
+    offline  silent WAV clips with a speech-like duration, for tests and offline runs
+
+Usage:
+    clip = synthesize("The Fourier Transform decomposes a function.")
+    clip["path"], clip["duration"]
+"""
+
+import os
+import wave
+
+from llm_cache import sha256_text
+from atomic_files import atomic_path
+
+TTS_CACHE_DIR = os.path.abspath(os.environ.get('TTS_CACHE_DIR', os.path.join('media', 'tts_cache')))
+TTS_ENGINE = os.environ.get('TTS_ENGINE', 'gtts')
+TTS_LANG = os.environ.get('TTS_LANG', 'en')
+
+# Speaking rate assumed by the offline stand-in.
+OFFLINE_WORDS_PER_SECOND = 2.5
+OFFLINE_SAMPLE_RATE = 22050
+
+counters = {'hits': 0, 'misses': 0}
+
+def _synthesize_gtts(text, path):
+    from gtts import gTTS
+    gTTS(text=text, lang=TTS_LANG).save(path)
+
+def _synthesize_offline(text, path):
+    seconds = max(0.5, len(text.split()) / OFFLINE_WORDS_PER_SECOND)
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(OFFLINE_SAMPLE_RATE)
+        out.writeframes(b'\x00\x00' * int(seconds * OFFLINE_SAMPLE_RATE))
+
+ENGINES = {
+    'gtts': (_synthesize_gtts, '.mp3'),
+    'offline': (_synthesize_offline, '.wav'),
+}
+
+def clip_duration(path):
+    """Length of an audio clip in seconds."""
+    if path.endswith('.wav'):
+        with wave.open(path, 'rb') as f:
+            return f.getnframes() / f.getframerate()
+    import av
+    with av.open(path) as container:
+        return container.duration / av.time_base
+
+def synthesize(text, engine=TTS_ENGINE, directory=TTS_CACHE_DIR):
+    """Returns {"path", "duration"} of the spoken `text`, synthesizing it only on a cache miss."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown TTS engine: {engine}")
+    generate, ext = ENGINES[engine]
+    voice = TTS_LANG if engine == 'gtts' else ''
+    path = os.path.join(directory, sha256_text(f'{engine}\0{voice}\0{text}') + ext)
+    if os.path.exists(path):
+        counters['hits'] += 1
+    else:
+        counters['misses'] += 1
+        with atomic_path(path, suffix='.tmp' + ext) as tmp_path:
+            generate(text, tmp_path)
+    return {'path': path, 'duration': clip_duration(path)}
+
+def stats():
+    return dict(counters)
@@ -0,0 +1,164 @@
+"""
+upload_index.py
+
+A local index of videos already uploaded to the Gemini files API.
+
+The index maps the sha256 of a video's bytes to the remote file name and its
+expiry time. A job whose video is already uploaded and still ACTIVE reuses the
+remote file, skipping both the upload and the PROCESSING wait.
+
+Usage:
+    video_file = get_or_upload(video_path, sha256_file(video_path))
+"""
+
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+
+from atomic_files import atomic_path
+
+UPLOAD_INDEX_PATH = os.environ.get('UPLOAD_INDEX_PATH', os.path.join('media', 'upload_index.json'))
+
+# Gemini keeps uploaded files for 48 hours; stop reusing them a little earlier.
+DEFAULT_FILE_TTL = 47 * 3600
+
+class GenaiFilesAPI:
+    """The Gemini files API (google.generativeai.upload_file / get_file)."""
+
+    def upload(self, path):
+        import google.generativeai as genai
+        return genai.upload_file(path=path)
+
+    def get(self, name):
+        import google.generativeai as genai
+        return genai.get_file(name)
+
+class LocalFile:
+    """Mimics the fields of a genai File that the pipeline uses."""
+
+    def __init__(self, name, path, state='PROCESSING', expiration_time=None):
+        self.name = name
+        self.uri = f"file://{os.path.abspath(path)}"
+        self.state = type('State', (), {'name': state})
+        self.expiration_time = expiration_time
+
+class LocalFilesAPI:
+    """
+    An offline stand-in for the files API, for testing. Uploaded files report
+    PROCESSING for `processing_polls` get() calls and then become ACTIVE.
+    """
+
+    def __init__(self, processing_polls=0, ttl=DEFAULT_FILE_TTL):
+        self.processing_polls = processing_polls
+        self.ttl = ttl
+        self.files = {}  # name -> [path, remaining PROCESSING polls, expiry timestamp]
+        self.uploads = 0
+
+    def upload(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Video file {path} not found.")
+        self.uploads += 1
+        name = f"files/local-{self.uploads}"
+        self.files[name] = [path, self.processing_polls, time.time() + self.ttl]
+        return self._file(name)
+
+    def get(self, name):
+        if name not in self.files or self.files[name][2] < time.time():
+            raise KeyError(f"File {name} not found")
+        entry = self.files[name]
+        entry[1] = max(entry[1] - 1, 0)
+        return self._file(name)
+
+    def _file(self, name):
+        from datetime import datetime, timezone
+        path, polls, expires_at = self.files[name]
+        return LocalFile(name, path, 'PROCESSING' if polls else 'ACTIVE',
+                         datetime.fromtimestamp(expires_at, timezone.utc))
+
+def expiry_timestamp(video_file):
+    """Expiry of a remote file as a Unix timestamp, defaulting to DEFAULT_FILE_TTL from now."""
+    expiration_time = getattr(video_file, 'expiration_time', None)
+    if expiration_time is not None and hasattr(expiration_time, 'timestamp'):
+        return expiration_time.timestamp()
+    return time.time() + DEFAULT_FILE_TTL
+
+class UploadIndex:
+    """content hash -> {name, uri, expires_at}, stored as JSON and shared between workers."""
+
+    def __init__(self, path=UPLOAD_INDEX_PATH):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, entries):
+        with atomic_path(self.path) as tmp_path, open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+
+    def lookup(self, content_hash):
+        """Returns the entry for a hash if it has not expired, else None."""
+        entry = self._read().get(content_hash)
+        if entry and entry['expires_at'] > time.time():
+            return entry
+        return None
+
+    def record(self, content_hash, video_file):
+        with self._locked():
+            entries = self._read()
+            now = time.time()
+            entries = {h: e for h, e in entries.items() if e['expires_at'] > now}
+            entries[content_hash] = {
+                'name': video_file.name,
+                'uri': video_file.uri,
+                'expires_at': expiry_timestamp(video_file),
+            }
+            self._write(entries)
+
+    def forget(self, content_hash):
+        with self._locked():
+            entries = self._read()
+            if entries.pop(content_hash, None) is not None:
+                self._write(entries)
+
+index = UploadIndex()
+
+def get_or_upload(video_path, content_hash, files_api=None, upload_index=None):
+    """
+    Returns a remote file for the video: the indexed upload when it still exists
+    and hasn't failed, otherwise a fresh upload (which is then indexed).
+    The returned file may still be PROCESSING.
+    """
+    files_api = files_api or GenaiFilesAPI()
+    upload_index = upload_index or index
+    entry = upload_index.lookup(content_hash)
+    if entry is not None:
+        try:
+            video_file = files_api.get(entry['name'])
+            if video_file.state.name in ('ACTIVE', 'PROCESSING'):
+                print(f"Reusing uploaded file: {video_file.name}")
+                return video_file
+        except Exception as e:
+            print(f"Indexed upload {entry['name']} is no longer available: {e}")
+        upload_index.forget(content_hash)
+
+    print("Uploading file:", video_path)
+    video_file = files_api.upload(video_path)
+    print(f"Completed upload: {video_file.uri}")
+    upload_index.record(content_hash, video_file)
+    return video_file
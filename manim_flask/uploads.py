@@ -0,0 +1,149 @@
+"""
+uploads.py
+
+Chunked, resumable uploads of local video files.
+
+A client creates an upload with the file's name and size, then sends the bytes
+in order as PATCH bodies tagged with their Upload-Offset. Each body is streamed
+to disk in small blocks, never held in memory, and hashed on the way, so when
+the last byte arrives the file is stored under its sha256 and a second upload
+of the same video is deduplicated. An interrupted client asks for the current
+offset and continues from there.
+
+Usage:
+    upload = uploads.create("lecture.mp4", size)
+    uploads.append(upload["upload_id"], 0, request.stream)
+    uploads.path_for(file_id)   # once complete
+"""
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import threading
+
+# Block size used when streaming request bodies to disk.
+BLOCK_SIZE = 1024 * 1024
+
+# Chunk size suggested to clients.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+FILE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{1,8}$')
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def _extension(filename):
+    # Gemini's upload_file picks the MIME type from the extension, so keep a sane one.
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if re.match(r'^\.[a-z0-9]{1,8}$', ext) else '.mp4'
+
+class ChunkedUploads:
+    """Upload sessions stored as <id>.part plus <id>.json metadata in `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'partial'), exist_ok=True)
+        self._hashers = {}  # upload id -> running sha256 of the bytes received so far
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.directory, 'partial', upload_id + '.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, 'partial', upload_id + '.json')
+
+    def path_for(self, file_id):
+        """Path of a completed upload, or None if file_id is invalid or unknown."""
+        if not FILE_ID_PATTERN.match(file_id or ''):
+            return None
+        path = os.path.join(self.directory, file_id)
+        return path if os.path.isfile(path) else None
+
+    def create(self, filename, size):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('A positive file size is required')
+        upload_id = uuid.uuid4().hex
+        meta = {'upload_id': upload_id, 'filename': filename, 'size': size, 'file_id': None}
+        with open(self._meta_path(upload_id), 'w') as f:
+            json.dump(meta, f)
+        open(self._part_path(upload_id), 'wb').close()
+        return self.status(upload_id)
+
+    def _meta(self, upload_id):
+        if not re.match(r'^[0-9a-f]{32}$', upload_id):
+            raise UploadError('Unknown upload', 404)
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Unknown upload', 404)
+
+    def status(self, upload_id):
+        meta = self._meta(upload_id)
+        if meta['file_id']:
+            offset = meta['size']
+        else:
+            offset = os.path.getsize(self._part_path(upload_id))
+        return {**meta, 'offset': offset, 'complete': meta['file_id'] is not None, 'chunk_size': CHUNK_SIZE}
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _hasher(self, upload_id, part_path):
+        hasher = self._hashers.get(upload_id)
+        if hasher is None:
+            # Resuming after a restart: rebuild the running hash from the bytes on disk.
+            hasher = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                    hasher.update(block)
+            self._hashers[upload_id] = hasher
+        return hasher
+
+    def append(self, upload_id, offset, stream):
+        """
+        Streams one chunk from a file-like `stream` onto the upload, which must
+        continue exactly at the current offset. Finishes the upload when the
+        declared size is reached and returns the new status.
+        """
+        with self._session_lock(upload_id):
+            meta = self._meta(upload_id)
+            if meta['file_id']:
+                return self.status(upload_id)
+            part_path = self._part_path(upload_id)
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadError(f'Expected offset {current}', 409, current)
+            hasher = self._hasher(upload_id, part_path)
+            with open(part_path, 'ab') as f:
+                for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+                    current += len(block)
+                    if current > meta['size']:
+                        f.truncate(offset)
+                        self._hashers.pop(upload_id, None)
+                        raise UploadError('Upload is larger than its declared size', 413)
+                    f.write(block)
+                    hasher.update(block)
+            if current == meta['size']:
+                self._finish(meta, part_path, hasher.hexdigest())
+            return self.status(upload_id)
+
+    def _finish(self, meta, part_path, digest):
+        file_id = digest + _extension(meta['filename'])
+        final_path = os.path.join(self.directory, file_id)
+        if os.path.exists(final_path):
+            os.remove(part_path)  # same bytes uploaded before: keep the existing copy
+        else:
+            os.replace(part_path, final_path)
+        meta['file_id'] = file_id
+        meta['sha256'] = digest
+        with open(self._meta_path(meta['upload_id']), 'w') as f:
+            json.dump(meta, f)
+        self._hashers.pop(meta['upload_id'], None)
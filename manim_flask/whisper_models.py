@@ -0,0 +1,111 @@
+"""
+whisper_models.py
+
+A per-process registry of loaded Whisper models.
+
+Each model size is loaded from disk once and kept resident, so repeated jobs
+in a render worker skip whisper.load_model(). When the loaded models exceed
+the memory budget, the least recently used ones are dropped.
+
+Usage:
+    model = get_model("base")
+    result = model.transcribe(video_path)
+"""
+
+import gc
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+
+# Memory budget for resident models, overridable from the environment.
+WHISPER_MEMORY_BUDGET_MB = int(os.environ.get('WHISPER_MEMORY_BUDGET_MB', '4096'))
+
+# Approximate parameter counts (millions), used to make room before a model is loaded.
+MODEL_PARAMS_M = {
+    "tiny": 39, "tiny.en": 39,
+    "base": 74, "base.en": 74,
+    "small": 244, "small.en": 244,
+    "medium": 769, "medium.en": 769,
+    "large": 1550, "large-v1": 1550, "large-v2": 1550, "large-v3": 1550,
+    "turbo": 809, "large-v3-turbo": 809,
+}
+
+def estimate_model_bytes(name):
+    """Estimated fp32 size of a Whisper model before it is loaded."""
+    return MODEL_PARAMS_M[name] * 1_000_000 * 4
+
+def model_bytes(model):
+    """Actual size of a loaded model's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def _load_whisper_model(name):
+    import whisper
+    return whisper.load_model(name)
+
+class WhisperModelRegistry:
+    """Loads each model size once and evicts least recently used models over budget."""
+
+    def __init__(self, budget_bytes=WHISPER_MEMORY_BUDGET_MB * 1024 * 1024, loader=_load_whisper_model):
+        self.budget_bytes = budget_bytes
+        self._loader = loader
+        self._models = OrderedDict()  # name -> (model, size in bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name=DEFAULT_WHISPER_MODEL):
+        """Returns the resident model for `name`, loading it on first use."""
+        if name not in MODEL_PARAMS_M:
+            raise ValueError(f"Unknown Whisper model: {name}")
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self.hits += 1
+                return self._models[name][0]
+            self._make_room(estimate_model_bytes(name))
+            print(f"Loading Whisper model '{name}'...")
+            model = self._loader(name)
+            self._models[name] = (model, model_bytes(model))
+            self.loads += 1
+            return model
+
+    def resident_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def loaded(self):
+        """Names of the resident models, least recently used first."""
+        return list(self._models)
+
+    def _make_room(self, needed):
+        # A model larger than the whole budget still loads, alone.
+        evicted = False
+        while self._models and self.resident_bytes() + needed > self.budget_bytes:
+            name, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            evicted = True
+            print(f"Evicting Whisper model '{name}'")
+        if not evicted:
+            return
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+registry = WhisperModelRegistry()
+
+def get_model(name=DEFAULT_WHISPER_MODEL):
+    return registry.get(name)
+
+def preload(name=DEFAULT_WHISPER_MODEL):
+    """Loads a model when a worker process starts, so its first job doesn't wait for it."""
+    try:
+        get_model(name)
+    except ImportError:
+        print("Whisper is not installed; audio transcription will fail in this worker.")